@@ -0,0 +1,175 @@
+import asyncio
+import threading
+from datetime import datetime
+
+from flask import abort, current_app, render_template, request
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from cache import next_show_time, page_is_cacheable
+from conditional import (
+    artist_detail, artist_listing, conditional, page_version, show_listing, venue_detail,
+    venue_listing
+)
+from forms import GENRE_CHOICES
+from models import Artist, Venue
+import queries
+import search
+
+# Opt-in async read path (ASYNC_READS = True).
+#
+# The read-only views are swapped for `async def` versions that run the
+# statements from queries.py on an asyncpg engine, issuing independent
+# queries (a detail page's entity, upcoming and past shows) concurrently.
+# Flask runs every async view in its own short-lived event loop, so the
+# engine and its connection pool live on one long-lived loop in a
+# background thread per worker; views await results across loops through
+# run_coroutine_threadsafe. The thread starts on first use, after any
+# prefork, so it is never inherited by a forked worker.
+
+
+class AsyncReads:
+    def __init__(self, app=None):
+        self.engine = None
+        self.loop = None
+        self.sync_views = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['async_reads'] = self
+        self.url = app.config.get('SQLALCHEMY_ASYNC_URI') or \
+            app.config['SQLALCHEMY_DATABASE_URI'].replace('+psycopg2', '+asyncpg')
+        options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+        options.update((app.config.get('SQLALCHEMY_DIALECT_ENGINE_OPTIONS') or {}).get('postgresql', {}))
+        options.pop('connect_args', None)
+        timeout = app.config.get('DB_STATEMENT_TIMEOUT_MS')
+        if timeout:
+            options['connect_args'] = {'server_settings': {'statement_timeout': str(timeout)}}
+        self.engine_options = options
+        if app.config.get('ASYNC_READS'):
+            self.install(app)
+
+    def install(self, app):
+        for endpoint, view in ASYNC_VIEWS.items():
+            self.sync_views.setdefault(endpoint, app.view_functions[endpoint])
+            app.view_functions[endpoint] = view
+
+    def uninstall(self, app):
+        app.view_functions.update(self.sync_views)
+
+    def _start(self):
+        with self._lock:
+            if self.loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='async-reads', daemon=True).start()
+                self.engine = create_async_engine(self.url, **self.engine_options)
+                self.loop = loop
+
+    async def _fetch(self, stmt):
+        async with self.engine.connect() as conn:
+            return (await conn.execute(stmt)).all()
+
+    async def _gather(self, stmts):
+        return await asyncio.gather(*(self._fetch(stmt) for stmt in stmts))
+
+    async def fetch(self, *stmts):
+        # runs the statements concurrently, each on its own pooled connection
+        if self.loop is None:
+            self._start()
+        future = asyncio.run_coroutine_threadsafe(self._gather(stmts), self.loop)
+        return await asyncio.wrap_future(future)
+
+
+def _reads():
+    return current_app.extensions['async_reads']
+
+
+@conditional(venue_listing)
+async def venues():
+    genre = queries.requested_genre()
+    rows, = await _reads().fetch(queries.venue_areas(genre))
+    return render_template('pages/venues.html', areas=queries.group_areas(rows),
+                           genres=GENRE_CHOICES, genre=genre)
+
+
+@conditional(artist_listing)
+async def artists():
+    genre = queries.requested_genre()
+    data, = await _reads().fetch(queries.artist_list(genre))
+    return render_template('pages/artists.html', artists=data,
+                           genres=GENRE_CHOICES, genre=genre)
+
+
+@conditional(show_listing)
+async def shows():
+    data, = await _reads().fetch(queries.show_list())
+    return render_template('pages/shows.html', shows=data)
+
+
+async def _search(model, template):
+    search_term = request.form.get('search_term', '')
+    limit, offset = search.clamp(
+        request.form.get('limit', search.SEARCH_LIMIT, type=int),
+        request.form.get('offset', 0, type=int))
+    rows_stmt, count_stmt = search.postgres_statements(model, search_term.strip(), limit, offset)
+    rows, = await _reads().fetch(rows_stmt)
+    if rows:
+        count = rows[0].total
+    else:
+        count_rows, = await _reads().fetch(count_stmt)
+        count = count_rows[0][0]
+    response = {
+        "count": count,
+        "data": search.hits(rows)
+    }
+    return render_template(template, results=response, search_term=search_term)
+
+
+async def search_venues():
+    return await _search(Venue, 'pages/search_venues.html')
+
+
+async def search_artists():
+    return await _search(Artist, 'pages/search_artists.html')
+
+
+async def _detail(key, statements, template, name):
+    page_cache = current_app.extensions['page_cache']
+    cacheable = page_is_cacheable()
+    if cacheable:
+        body = page_cache.get(key, page_version())
+        if body is not None:
+            return body
+
+    entity, upcoming_shows, past_shows = await _reads().fetch(*statements)
+    if not entity:
+        abort(404)
+    body = render_template(template, **{name: entity[0]},
+                           upcoming_shows=upcoming_shows, past_shows=past_shows)
+    if cacheable:
+        page_cache.set(key, body, next_show_time(upcoming_shows), page_version())
+    return body
+
+
+@conditional(venue_detail)
+async def show_venue(venue_id):
+    return await _detail(f'venue:{venue_id}', queries.venue_page(venue_id, datetime.now()),
+                         'pages/show_venue.html', 'venue')
+
+
+@conditional(artist_detail)
+async def show_artist(artist_id):
+    return await _detail(f'artist:{artist_id}', queries.artist_page(artist_id, datetime.now()),
+                         'pages/show_artist.html', 'artist')
+
+
+ASYNC_VIEWS = {
+    'venues.index': venues,
+    'artists.index': artists,
+    'shows.index': shows,
+    'venues.search_venues': search_venues,
+    'artists.search_artists': search_artists,
+    'venues.show_venue': show_venue,
+    'artists.show_artist': show_artist,
+}
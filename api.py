@@ -0,0 +1,162 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime, time, timedelta
+
+from flask import Blueprint, Response, abort, jsonify, request, stream_with_context, url_for
+
+import autocomplete
+from cache import current_page_cache
+from conditional import conditional, show_calendar
+from models import Artist, Show, Venue, db
+import queries
+
+bp = Blueprint('api', __name__)
+
+
+#  API
+#  ----------------------------------------------------------------
+
+API_BATCH_SIZE = 1000
+
+
+def json_default(value):
+    # json.dumps default= for rows with datetime columns
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def stream_rows(query):
+    # Rows come off a server-side cursor API_BATCH_SIZE at a time and are
+    # written out as they arrive, so memory use does not grow with the table.
+    # ?format=json wraps them in a JSON array, the default is NDJSON.
+    as_array = request.args.get('format') == 'json'
+
+    def generate():
+        rows = query.execution_options(stream_results=True).yield_per(API_BATCH_SIZE)
+        chunk = []
+        first = True
+        if as_array:
+            yield '['
+        for row in rows:
+            line = json.dumps(row._asdict(), default=json_default)
+            if as_array:
+                line = line if first else ',' + line
+                first = False
+            else:
+                line += '\n'
+            chunk.append(line)
+            if len(chunk) >= API_BATCH_SIZE:
+                yield ''.join(chunk)
+                chunk = []
+        if chunk:
+            yield ''.join(chunk)
+        if as_array:
+            yield ']'
+
+    mimetype = 'application/json' if as_array else 'application/x-ndjson'
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
+
+@bp.route('/api/venues')
+def venues():
+    return stream_rows(db.session.query(*Venue.__table__.columns).order_by(Venue.id))
+
+
+@bp.route('/api/artists')
+def artists():
+    return stream_rows(db.session.query(*Artist.__table__.columns).order_by(Artist.id))
+
+
+@bp.route('/api/shows')
+def shows():
+    return stream_rows(db.session.query(*Show.__table__.columns).order_by(Show.id))
+
+
+CALENDAR_LIMIT = 100
+MAX_CALENDAR_LIMIT = 500
+CALENDAR_DAYS = 31
+MAX_CALENDAR_DAYS = 366
+
+
+def encode_cursor(row):
+    key = f'{row.start_time.isoformat()}|{row.id}'
+    return base64.urlsafe_b64encode(key.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        key = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        start_time, show_id = key.split('|')
+        return datetime.fromisoformat(start_time), int(show_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        abort(400, description='Invalid cursor')
+
+
+def _requested_datetime(name, default):
+    value = request.args.get(name)
+    if not value:
+        return default
+    try:
+        value = datetime.fromisoformat(value)
+    except ValueError:
+        abort(400, description=f'{name} must be an ISO 8601 date or datetime')
+    if value.tzinfo is not None:
+        # show times are naive local time; an offset is converted to it
+        value = value.astimezone().replace(tzinfo=None)
+    return value
+
+
+@bp.route('/api/shows/range')
+@conditional(show_calendar)
+def show_range():
+    # ?start=&end= (ISO 8601, default CALENDAR_DAYS days from today), optional
+    # venue_id, artist_id, city, state and genre filters, limit, and the
+    # next_cursor of the previous page as cursor
+    start = _requested_datetime('start', datetime.combine(date.today(), time.min))
+    end = _requested_datetime('end', start + timedelta(days=CALENDAR_DAYS))
+    if not start < end <= start + timedelta(days=MAX_CALENDAR_DAYS):
+        abort(400, description=f'end must be after start and at most {MAX_CALENDAR_DAYS} days later')
+    limit = max(1, min(request.args.get('limit', CALENDAR_LIMIT, type=int), MAX_CALENDAR_LIMIT))
+    cursor = request.args.get('cursor')
+
+    rows = db.session.execute(queries.show_range(
+        start, end, limit + 1,
+        after=decode_cursor(cursor) if cursor else None,
+        venue_id=request.args.get('venue_id', type=int),
+        artist_id=request.args.get('artist_id', type=int),
+        city=request.args.get('city') or None,
+        state=request.args.get('state') or None,
+        genre=queries.requested_genre())).all()
+    page = rows[:limit]
+    return jsonify({
+        'data': [dict(row._asdict(),
+                      start_time=row.start_time.isoformat(),
+                      end_time=(row.start_time + timedelta(minutes=row.duration_minutes)).isoformat())
+                 for row in page],
+        'next_cursor': encode_cursor(page[-1]) if len(rows) > limit else None,
+    })
+
+
+@bp.route('/autocomplete')
+def complete():
+    # ?q= name prefix, optional type=venue|artist and limit; answered from
+    # the worker's in-memory index
+    kind = request.args.get('type') or None
+    if kind is not None and kind not in autocomplete.KINDS:
+        abort(400, description='type must be venue or artist')
+    suggestions = autocomplete.complete(
+        request.args.get('q', ''),
+        limit=request.args.get('limit', autocomplete.AUTOCOMPLETE_LIMIT, type=int),
+        kind=kind)
+    return jsonify({'data': [
+        dict(suggestion._asdict(),
+             url=url_for(f'{suggestion.kind}s.show_{suggestion.kind}', **{f'{suggestion.kind}_id': suggestion.id}))
+        for suggestion in suggestions
+    ]})
+
+
+@bp.route('/cache/stats')
+def cache_stats():
+    return jsonify(current_page_cache.stats())
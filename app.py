@@ -2,464 +2,185 @@
 # Imports
 #----------------------------------------------------------------------------#
 
-import json
-import dateutil.parser
-import babel
-from flask import (
-    Flask,
-    render_template,
-    request, Response,
-    flash,
-    redirect,
-    url_for
-)
-from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
+import importlib
 import logging
+from functools import lru_cache
 from logging import Formatter, FileHandler
-from flask_wtf import Form
-from forms import *
-import sys
 
-from flask_migrate import Migrate
+import click
+from flask import Flask, render_template
+from flask.cli import AppGroup
+from werkzeug.local import LocalProxy
 
-from models import Artist, Venue, db, Show
-#----------------------------------------------------------------------------#
-# App Config.
-#----------------------------------------------------------------------------#
+from assets import Assets
+from cache import PageCache
+from instrumentation import RequestProfiler
+from models import db
+from recent import RecentListings
+from template_cache import TemplateCache
 
-app = Flask(__name__)
-moment = Moment(app)
-app.config.from_pyfile('config.py')
-db.init_app(app)
-migrate = Migrate(app, db)
+# Only what every worker needs is imported here. Babel, dateutil,
+# Flask-Moment, Flask-Migrate, the async read path and the CLI commands are
+# imported on first use, so `import wsgi` stays cheap for a prefork
+# server; `flask importtime` checks it against IMPORT_TIME_BUDGET_MS.
 
 #----------------------------------------------------------------------------#
-# Models.
+# App Config.
 #----------------------------------------------------------------------------#
 
 
+def create_app(config=None):
+    app = Flask(__name__)
+    app.config.from_pyfile('config.py')
+    if config:
+        app.config.update(config)
+
+    db.init_app(app)
+    PageCache(app)
+    RecentListings(app)
+    Assets(app)
+    TemplateCache(app)
+
+    from api import bp as api_bp
+    from artists import bp as artists_bp
+    from shows import bp as shows_bp
+    from venues import bp as venues_bp
+    app.register_blueprint(venues_bp)
+    app.register_blueprint(artists_bp)
+    app.register_blueprint(shows_bp)
+    app.register_blueprint(api_bp)
+    app.add_url_rule('/', 'index', index)
+
+    app.jinja_env.filters['datetime'] = format_datetime
+    app.context_processor(lambda: {'moment': moment})
+    app.register_error_handler(404, not_found_error)
+    app.register_error_handler(500, server_error)
+    configure_logging(app)
+
+    RequestProfiler(app)
+    if app.config.get('ASYNC_READS'):
+        from aio import AsyncReads
+        AsyncReads(app)
+
+    app.cli = LazyGroup(COMMANDS, name=app.cli.name)
+    if click.get_current_context(silent=True) is not None:
+        # `flask db` comes from Flask-Migrate's own entry point
+        from flask_migrate import Migrate
+        Migrate(app, db)
+    return app
+
+
+COMMANDS = {
+    'import': 'importer:import_command',
+    'seed': 'seed:seed_command',
+    'bench': 'bench:bench_command',
+    'bench-areas': 'bench:bench_areas_command',
+    'bench-tiles': 'bench:bench_tiles_command',
+    'counters': 'counters:counters_cli',
+    'bulk': 'bulk:bulk_cli',
+    'assets': 'assets:assets_cli',
+    'templates': 'template_cache:templates_cli',
+    'importtime': 'importtime:importtime_command',
+    'explain': 'explain:explain_command',
+    'geo': 'geo:geo_cli',
+}
+
+
+class LazyGroup(AppGroup):
+    # Commands are given as 'module:attribute' and imported when invoked.
+
+    def __init__(self, lazy_commands, **kwargs):
+        super().__init__(**kwargs)
+        self.lazy_commands = lazy_commands
+
+    def list_commands(self, ctx):
+        return sorted(set(super().list_commands(ctx)) | set(self.lazy_commands))
+
+    def get_command(self, ctx, name):
+        if name not in self.commands and name in self.lazy_commands:
+            module, attribute = self.lazy_commands[name].split(':')
+            self.add_command(getattr(importlib.import_module(module), attribute), name)
+        return super().get_command(ctx, name)
+
+
+def configure_logging(app):
+    if not app.debug:
+        file_handler = FileHandler('error.log')
+        file_handler.setFormatter(Formatter(
+            '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'))
+        app.logger.setLevel(logging.INFO)
+        file_handler.setLevel(logging.INFO)
+        app.logger.addHandler(file_handler)
+        app.logger.info('errors')
+
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-    date = dateutil.parser.parse(value)
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format, locale='en')
-
 
-app.jinja_env.filters['datetime'] = format_datetime
-
-#----------------------------------------------------------------------------#
-# Controllers.
-#----------------------------------------------------------------------------#
+@lru_cache(maxsize=None)
+def _datetime_support():
+    # Babel patterns are parsed once here rather than on every call.
+    import babel
+    from babel.dates import parse_pattern
+    from dateutil.parser import parse
+    formats = {
+        'full': parse_pattern("EEEE MMMM, d, y 'at' h:mma"),
+        'medium': parse_pattern("EE MM, dd, y h:mma"),
+    }
+    return babel.Locale.parse('en'), formats, parse_pattern, parse
 
 
-@app.route('/')
-def index():
-    return render_template('pages/home.html')
+@lru_cache(maxsize=4096)
+def _format_datetime(value, format):
+    locale, formats, parse_pattern, parse = _datetime_support()
+    if isinstance(value, str):
+        value = parse(value)
+    pattern = formats.get(format)
+    if pattern is None:
+        pattern = parse_pattern(format)
+    return pattern.apply(value, locale)
 
 
-#  Venues
-#  ----------------------------------------------------------------
-
-@app.route('/venues')
-def venues():
-    data = []
-
-    venues = Venue.query.all()
-    locations = set()
-    for venue in venues:
-        locations.add((venue.city, venue.state))
-    for location in locations:
-        data.append({
-            "city": location[0],
-            "state": location[1],
-            "venues": []
-        })
-    for venue in venues:
-        for i in data:
-            if i['city'] == venue.city and i['state'] == venue.state:
-                upcoming_shows = Show.query.join(Venue).filter(Venue.id == venue.id).filter(
-                    Show.show_time > datetime.utcnow())
-                i['venues'].append(
-                    {'id': venue.id, 'name': venue.name, 'num_upcoming_shows': upcoming_shows.count()})
-                break
-
-    return render_template('pages/venues.html', areas=data)
-
-
-@app.route('/venues/search', methods=['POST'])
-def search_venues():
-    search_term = request.form.get('search_term', '')
-    venues = Venue.query.filter(Venue.name.ilike(f'%{search_term}%')).all()
-    response = {
-        "count": len(venues),
-        "data": venues
-    }
-    return render_template(
-        'pages/search_venues.html',
-        results=response,
-        search_term=request.form.get(
-            'search_term',
-            ''))
-
-
-@app.route('/venues/<int:venue_id>')
-def show_venue(venue_id):
-    data = venue.query.get(venue_id)
-    future_shows = Show.query.join(Venue).filter(Venue.id == venue_id).filter(Show.start_time > datetime.now()).all()
-    past_shows = Show.query.join(Venue).filter(Venue.id == venue_id).filter(Show.start_time < datetime.now()).all()
-
-
-    return render_template('pages/show_venue.html', venue=data, future_shows=future_shows, past_shows=past_shows)
-
-
-#  Create Venue
-#  ----------------------------------------------------------------
-
-@app.route('/venues/create', methods=['GET'])
-def create_venue_form():
-    form = VenueForm(request.form)
-    return render_template('forms/new_venue.html', form=form)
-
-
-@app.route('/venues/create', methods=['POST'])
-def create_venue_submission():
-    form = VenueForm(request.form)
-    if form.validate():
-        add = request.form.get 
-        try:
-            print(request.form.getlist('genres'))
-            new_venue = Venue(name=add('name'), city=add('city'), state=add('state'), address=add('address'),
-                              phone=add('phone'), genres=request.form.getlist('genres'), website_link=add('website_link'),
-                              facebook_link=add('facebook_link'),
-                              looking_for_talent=form.seeking_talent.data,
-                              seeking_description=add('seeking_description'))
-
-            db.session.add(new_venue)
-            db.session.commit()
-            flash('Venue ' + request.form['name'] + ' was listed!')
-        except:
-            db.session.rollback()
-            flash('An error occurred. Venue ' + add('name') + ' could not be listed.')
-        return redirect(url_for('index'))
-    else:
-        print(form.form_errors)
-        flash('An error occurred')
-        return redirect(url_for('index'))
-@app.route('/venues/<venue_id>', methods=['DELETE'])
-def delete_venue(venue_id):
-    # SQLAlchemy ORM to delete a record. Handle cases where the session commit
-    # could fail.
-    error = False
-    try:
-        venue = Venue.query.get(venue_id)
-        db.session.delete(venue)
-        db.session.commit()
-    except BaseException:
-        error = True
-        db.session.rollback()
-        print(sys.exc_info())
-    finally:
-        db.session.close()
-    if error:
-        flash('An error occurred. Venue could not be deleted.')
-    else:
-        flash('Venue was successfully deleted.')
-    return render_template('pages/home.html')
+def format_datetime(value, format='medium'):
+    return _format_datetime(value, format)
 
-#  Artists
-#  ----------------------------------------------------------------
 
+def _moment_class():
+    from flask_moment import moment
+    return moment
 
-@app.route('/artists')
-def artists():
-    # TODO: replace with real data returned from querying the database
-    data = db.session.query(Artist).all()
-    return render_template('pages/artists.html', artists=data)
 
+moment = LocalProxy(_moment_class)
 
-@app.route('/artists/search', methods=['POST'])
-def search_artists():
-    # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
-    # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
-    # search for "band" should return "The Wild Sax Band".
-    search_term = request.form.get('search_term', '')
-    artists = Artist.query.filter(Artist.name.ilike(f'%{search_term}%')).all()
-    response = {
-        "count": len(artists),
-        "data": artists
-    }
-
-    return render_template(
-        'pages/search_artists.html',
-        results=response,
-        search_term=request.form.get(
-            'search_term',
-            ''))
-
-
-@app.route('/artists/<int:artist_id>')
-def show_artist(artist_id):
-    # shows the venue page with the given venue_id
-    artist = Artist.query.get(artist_id)
-    past_shows = Show.query.join(Venue).filter(Venue.id == artist_id).filter(Show.start_time < datetime.now()).all()
-    future_shows = Show.query.join(Venue).filter(Venue.id == artist_id).filter(Show.start_time > datetime.now()).all()
-    return render_template('pages/show_artist.html', artist=artist, past_shows=past_shows, future_shows=future_shows)
-
-   
-#  Update
-#  ----------------------------------------------------------------
-
-
-@app.route('/artists/<int:artist_id>/edit', methods=['GET'])
-def edit_artist(artist_id):
-
-    # TODO: populate form with fields from artist with ID <artist_id>
-    artist = Artist.query.get(artist_id)
-    form = ArtistForm(
-        name=artist.name,
-        city=artist.city,
-        state=artist.state,
-        phone=artist.phone,
-        genres=artist.genres,
-        facebook_link=artist.facebook_link,
-        image_link=artist.image_link,
-        website=artist.website,
-        seeking_venue=artist.seeking_venue,
-        seeking_description=artist.seeking_description
-    )
-
-    return render_template('forms/edit_artist.html', form=form, artist=artist)
-
-
-@app.route('/artists/<int:artist_id>/edit', methods=['POST'])
-def edit_artist_submission(artist_id):
-    # TODO: take values from the form submitted, and update existing
-    # artist record with ID <artist_id> using the new attributes
-    aritist = Artist.query.get(artist_id)
-    form = ArtistForm(request.form)
-    if form.validate():
-        artist.name = form.name.data
-        artist.phone = form.phone.data
-        artist.city = form.city.data
-        artist.state = form.state.data
-        artist.genres = form.genres.data
-        artist.image_link = form.image_link.data
-        artist.website_link = form.website_link.data
-        artist.looking_for_venues = form.seeking_venue.data
-        artist.seeking_description = form.seeking_description.data
-        db.session.commit()
-        return redirect(url_for('show_artist', artist_id=artist_id))
-    else:
-        flash(f'An error occurred. Please check the form properly and try again.')
-    return redirect(url_for('show_artist', artist_id=artist_id))
-
-
-@app.route('/venues/<int:venue_id>/edit', methods=['GET'])
-def edit_venue(venue_id):
-    form = VenueForm()
-    # TODO: populate form with values from venue with ID <venue_id>
-    venue = Venue.query.get(venue_id)
-    form.name.data = venue.name
-    form.city.data = venue.city
-    form.state.data = venue.state
-    form.phone.data = venue.phone
-    form.genres.data = venue.genres
-    form.facebook_link.data = venue.facebook_link
-    form.image_link.data = venue.image_link
-    form.website.data = venue.website
-    form.seeking_talent.data = venue.seeking_talent
-    form.seeking_description.data = venue.seeking_description
-
-    return render_template('forms/edit_venue.html', form=form, venue=venue)
-
-
-@app.route('/venues/<int:venue_id>/edit', methods=['POST'])
-def edit_venue_submission(venue_id):
-    # TODO: take values from the form submitted, and update existing
-    # venue record with ID <venue_id> using the new attributes
-    venue = Venue.query.get(venue_id)
-    form = VenueForm(request.form)
-    if form.validate():
-        venue.name = form.name.data
-        venue.city = form.city.data
-        venue.state = form.state.data
-        venue.phone = form.phone.data
-        venue.genres = form.genres.data
-        venue.facebook_link = form.facebook_link.data
-        venue.image_link = form.image_link.data
-        venue.website = form.website.data
-        venue.seeking_talent = form.seeking_talent.data
-        venue.seeking_description = form.seeking_description.data
-        db.session.commit()
-        return redirect(url_for('show_venue', venue_id=venue_id))
-    else:
-        flash(f'An error occurred. Please check the form properly and try again.')
-    return redirect(url_for('show_venue', venue_id=venue_id))
-
-#  Create Artist
-#  ----------------------------------------------------------------
-
-
-@app.route('/artists/create', methods=['GET'])
-def create_artist_form():
-    form = ArtistForm()
-    return render_template('forms/new_artist.html', form=form)
-
-
-@app.route('/artists/create', methods=['POST'])
-def create_artist_submission():
-    # called upon submitting the new artist listing form
-    # TODO: insert form data as a new Venue record in the db, instead
-    # TODO: modify data to be the data object returned from db insertion
-    error = False
-    try:
-        name = request.form['name']
-        city = request.form['city']
-        state = request.form['state']
-        phone = request.form['phone']
-        genres = request.form.getlist('genres')
-        facebook_link = request.form['facebook_link']
-        image_link = request.form['image_link']
-        website = request.form['website']
-        seeking_venue = True if 'seeking_venue' in request.form else False
-        seeking_description = request.form['seeking_description']
-        artist = Artist(
-            name=name,
-            city=city,
-            state=state,
-            phone=phone,
-            genres=genres,
-            facebook_link=facebook_link,
-            image_link=image_link,
-            website=website,
-            seeking_venue=seeking_venue,
-            seeking_description=seeking_description)
-        db.session.add(artist)
-        db.session.commit()
-    except BaseException:
-        error = True
-        db.session.rollback()
-        print(sys.exc_info())
-    finally:
-        db.session.close()
-    if error:
-        # TODO: on unsuccessful db insert, flash an error instead.
-
-        flash(
-            'An error occurred. Artist ' +
-            request.form['name'] +
-            ' could not be listed.')
-    else:
-        # on successful db insert, flash success
-        flash('Artist ' + request.form['name'] + ' was successfully listed!')
-
-    # e.g., flash('An error occurred. Artist ' + data.name + ' could not be
-    # listed.')
-    return render_template('pages/home.html')
+#----------------------------------------------------------------------------#
+# Controllers.
+#----------------------------------------------------------------------------#
 
 
-#  Shows
-#  ----------------------------------------------------------------
-
-@app.route('/shows')
-def shows():
-    # displays list of shows at /shows
-    # TODO: replace with real venues data.
-    # num_shows should be aggregated based on number of upcoming shows per
-    # venue.
-    data = []
-    shows = Show.query.all()
-    for show in shows:
-        data.append({
-            "venue_id": show.venue_id,
-            "venue_name": show.venue.name,
-            "artist_id": show.artist_id,
-            "artist_name": show.artist.name,
-            "artist_image_link": show.artist.image_link,
-            "start_time": show.start_time
-        })
-
-    return render_template('pages/shows.html', shows=data)
-
-
-@app.route('/shows/create')
-def create_shows():
-    # renders form. do not touch.
-    form = ShowForm()
-    return render_template('forms/new_show.html', form=form)
-
-
-@app.route('/shows/create', methods=['POST'])
-def create_show_submission():
-    # called to create new shows in the db, upon submitting new show listing
-    # form
-    form = ShowForm(request.form)
-    error = False
-    try:
-        artist_id = request.form['artist_id']
-        venue_id = request.form['venue_id']
-        start_time = request.form['start_time']
-        show = Show(
-            artist_id=artist_id,
-            venue_id=venue_id,
-            start_time=start_time)
-        db.session.add(show)
-        db.session.commit()
-    except BaseException:
-        error = True
-        db.session.rollback()
-        print(sys.exc_info())
-    finally:
-        db.session.close()
-    if error:
-        flash('An error occurred. Show could not be listed.')
-    else:
-        flash('Show was successfully listed!')
+def index():
     return render_template('pages/home.html')
 
-    # on successful db insert, flash success
 
-    # e.g., flash('An error occurred. Show could not be listed.')
-    # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
-
-
-@app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
 
 
-@app.errorhandler(500)
 def server_error(error):
     return render_template('errors/500.html'), 500
 
 
-if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(Formatter(
-        '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'))
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
-
 #----------------------------------------------------------------------------#
 # Launch.
 #----------------------------------------------------------------------------#
 
 # Default port:
 if __name__ == '__main__':
-    app.run()
+    create_app().run()
 
 # Or specify port manually:
 '''
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port)
+    create_app().run(host='0.0.0.0', port=port)
 '''
@@ -0,0 +1,201 @@
+import sys
+from datetime import datetime
+
+from flask import Blueprint, abort, flash, redirect, render_template, request, url_for
+
+import autocomplete
+from cache import current_page_cache, next_show_time, page_is_cacheable, page_keys
+from conditional import artist_detail, artist_feed, artist_listing, conditional, page_version
+from forms import GENRE_CHOICES, ArtistForm
+import ical
+from models import Artist, Show, db
+import queries
+from recent import current_recent_listings
+from routing import use_primary
+import search
+
+bp = Blueprint('artists', __name__, url_prefix='/artists')
+
+
+#  Artists
+#  ----------------------------------------------------------------
+
+@bp.route('')
+@conditional(artist_listing)
+def index():
+    genre = queries.requested_genre()
+    data = db.session.execute(queries.artist_list(genre)).all()
+    return render_template('pages/artists.html', artists=data,
+                           genres=GENRE_CHOICES, genre=genre)
+
+
+@bp.route('/search', methods=['POST'])
+def search_artists():
+    search_term = request.form.get('search_term', '')
+    count, artists = search.search(
+        Artist, search_term,
+        limit=request.form.get('limit', search.SEARCH_LIMIT, type=int),
+        offset=request.form.get('offset', 0, type=int))
+    response = {
+        "count": count,
+        "data": artists
+    }
+
+    return render_template(
+        'pages/search_artists.html',
+        results=response,
+        search_term=request.form.get(
+            'search_term',
+            ''))
+
+
+@bp.route('/<int:artist_id>')
+@conditional(artist_detail)
+def show_artist(artist_id):
+    # shows the artist page with the given artist_id
+    key = f'artist:{artist_id}'
+    cacheable = page_is_cacheable()
+    if cacheable:
+        body = current_page_cache.get(key, page_version())
+        if body is not None:
+            return body
+        use_primary()
+
+    artist_stmt, upcoming_stmt, past_stmt = queries.artist_page(artist_id, datetime.now())
+    artist = db.session.execute(artist_stmt).first()
+    if artist is None:
+        abort(404)
+    upcoming_shows = db.session.execute(upcoming_stmt).all()
+    past_shows = db.session.execute(past_stmt).all()
+
+    body = render_template('pages/show_artist.html', artist=artist,
+                           upcoming_shows=upcoming_shows, past_shows=past_shows)
+    if cacheable:
+        current_page_cache.set(key, body, next_show_time(upcoming_shows), page_version())
+    return body
+
+
+@bp.route('/<int:artist_id>/calendar.ics')
+@conditional(artist_feed)
+def artist_calendar(artist_id):
+    artist = db.session.execute(queries.entity(Artist, artist_id)).first()
+    if artist is None:
+        abort(404)
+    return ical.calendar_response(artist.name, f'artist-{artist_id}.ics', queries.feed_shows(
+        Show.artist_id, artist_id, ical.feed_start()))
+
+
+#  Update
+#  ----------------------------------------------------------------
+
+
+@bp.route('/<int:artist_id>/edit', methods=['GET'])
+def edit_artist(artist_id):
+
+    # TODO: populate form with fields from artist with ID <artist_id>
+    artist = Artist.query.get(artist_id)
+    form = ArtistForm(
+        name=artist.name,
+        city=artist.city,
+        state=artist.state,
+        phone=artist.phone,
+        genres=artist.genres,
+        facebook_link=artist.facebook_link,
+        image_link=artist.image_link,
+        website_link=artist.website_link,
+        seeking_venue=artist.seeking_venue,
+        seeking_description=artist.seeking_description
+    )
+
+    return render_template('forms/edit_artist.html', form=form, artist=artist)
+
+
+@bp.route('/<int:artist_id>/edit', methods=['POST'])
+def edit_artist_submission(artist_id):
+    # TODO: take values from the form submitted, and update existing
+    # artist record with ID <artist_id> using the new attributes
+    artist = Artist.query.get(artist_id)
+    form = ArtistForm(request.form)
+    if form.validate():
+        artist.name = form.name.data
+        artist.phone = form.phone.data
+        artist.city = form.city.data
+        artist.state = form.state.data
+        artist.genres = form.genres.data
+        artist.image_link = form.image_link.data
+        artist.website_link = form.website_link.data
+        artist.seeking_venue = form.seeking_venue.data
+        artist.seeking_description = form.seeking_description.data
+        db.session.commit()
+        search.invalidate(Artist)
+        autocomplete.update('artist', artist.id, artist.name)
+        current_recent_listings.update('artist', artist)
+        current_page_cache.invalidate(*page_keys(Artist, artist_id))
+        return redirect(url_for('artists.show_artist', artist_id=artist_id))
+    else:
+        flash(f'An error occurred. Please check the form properly and try again.')
+    return redirect(url_for('artists.show_artist', artist_id=artist_id))
+
+#  Create Artist
+#  ----------------------------------------------------------------
+
+
+@bp.route('/create', methods=['GET'])
+def create_artist_form():
+    form = ArtistForm()
+    return render_template('forms/new_artist.html', form=form)
+
+
+@bp.route('/create', methods=['POST'])
+def create_artist_submission():
+    # called upon submitting the new artist listing form
+    # TODO: insert form data as a new Venue record in the db, instead
+    # TODO: modify data to be the data object returned from db insertion
+    error = False
+    try:
+        name = request.form['name']
+        city = request.form['city']
+        state = request.form['state']
+        phone = request.form['phone']
+        genres = request.form.getlist('genres')
+        facebook_link = request.form['facebook_link']
+        image_link = request.form['image_link']
+        website_link = request.form['website_link']
+        seeking_venue = True if 'seeking_venue' in request.form else False
+        seeking_description = request.form['seeking_description']
+        artist = Artist(
+            name=name,
+            city=city,
+            state=state,
+            phone=phone,
+            genres=genres,
+            facebook_link=facebook_link,
+            image_link=image_link,
+            website_link=website_link,
+            seeking_venue=seeking_venue,
+            seeking_description=seeking_description)
+        db.session.add(artist)
+        db.session.commit()
+        search.invalidate(Artist)
+        autocomplete.update('artist', artist.id, artist.name)
+        current_recent_listings.add('artist', artist)
+    except BaseException:
+        error = True
+        db.session.rollback()
+        print(sys.exc_info())
+    finally:
+        db.session.close()
+    if error:
+        # TODO: on unsuccessful db insert, flash an error instead.
+
+        flash(
+            'An error occurred. Artist ' +
+            request.form['name'] +
+            ' could not be listed.')
+    else:
+        # on successful db insert, flash success
+        flash('Artist ' + request.form['name'] + ' was successfully listed!')
+
+    # e.g., flash('An error occurred. Artist ' + data.name + ' could not be
+    # listed.')
+    return render_template('pages/home.html')
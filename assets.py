@@ -0,0 +1,185 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+
+import click
+from flask import current_app, request, send_from_directory, url_for
+from flask.cli import AppGroup
+
+try:
+    import brotli
+except ImportError:  # brotli variants are skipped without it
+    brotli = None
+
+# Static asset pipeline.
+#
+# `flask assets build` concatenates the stylesheets and scripts that
+# layouts/main.html loads into a few bundles, names each file after a hash of
+# its content (main.3f2a9c01d4e7.css), writes .gz and .br variants next to it
+# and records the names in static/dist/manifest.json. Pages then reference
+# the hashed files through /static/dist/, which serves the precompressed
+# variant the browser accepts with a one-year immutable Cache-Control; a new
+# build produces new names, so nothing is ever served stale. The manifest
+# and any other unhashed file there are served with no-cache. Until a build
+# exists the templates fall back to the individual source files.
+
+DIST_DIR = 'dist'
+MANIFEST = 'manifest.json'
+FAR_FUTURE = 365 * 24 * 3600
+
+# bundle name -> source files under static/, in load order
+BUNDLES = {
+    'main.css': [
+        'css/bootstrap.min.css',
+        'css/layout.main.css',
+        'css/main.css',
+        'css/main.responsive.css',
+        'css/main.quickfix.css',
+    ],
+    # loaded synchronously in <head>
+    'head.js': [
+        'js/libs/modernizr-2.8.2.min.js',
+        'js/libs/moment.min.js',
+    ],
+    # deferred, so it runs after the jQuery tag at the end of <body>
+    'app.js': [
+        'js/script.js',
+        'js/libs/bootstrap-3.1.1.min.js',
+        'js/plugins.js',
+    ],
+}
+
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+# main.3f2a9c01d4e7.css; anything else in dist/, such as the manifest, can
+# change under the same name
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+SOURCE_MAP = re.compile(r'^\s*//[#@] sourceMappingURL=.*$', re.M)
+
+
+def minify_css(css):
+    # conservative: drops comments and layout whitespace only. Bundles land
+    # in static/dist, a sibling of static/css, so relative url()s still hold.
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    return re.sub(r'\s*([{};,])\s*', r'\1', css).strip()
+
+
+def _bundle(static_folder, name, sources):
+    parts = []
+    for source in sources:
+        with open(os.path.join(static_folder, source), encoding='utf-8') as f:
+            parts.append(f.read())
+    if name.endswith('.css'):
+        return '\n'.join(minify_css(part) for part in parts)
+    # scripts are concatenated as shipped; the semicolon keeps one file's
+    # last statement from running into the next
+    return '\n;'.join(SOURCE_MAP.sub('', part) for part in parts)
+
+
+def _write(path, data):
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def build(app):
+    # Returns {bundle: (hashed name, size, gzip size, brotli size or None)}.
+    dist = os.path.join(app.static_folder, DIST_DIR)
+    os.makedirs(dist, exist_ok=True)
+    manifest = {}
+    report = {}
+    for name, sources in BUNDLES.items():
+        data = _bundle(app.static_folder, name, sources).encode('utf-8')
+        stem, ext = os.path.splitext(name)
+        hashed = f'{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+        path = os.path.join(dist, hashed)
+        _write(path, data)
+        gz = gzip.compress(data, compresslevel=9, mtime=0)
+        _write(path + '.gz', gz)
+        br = None
+        if brotli is not None:
+            br = brotli.compress(data, quality=11)
+            _write(path + '.br', br)
+        manifest[name] = hashed
+        report[name] = (hashed, len(data), len(gz), len(br) if br is not None else None)
+    _write(os.path.join(dist, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode())
+    app.extensions['assets'].manifest = manifest
+    return report
+
+
+class Assets:
+    def __init__(self, app=None):
+        self.manifest = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['assets'] = self
+        app.add_url_rule(f'{app.static_url_path}/{DIST_DIR}/<path:filename>',
+                         'dist', self.serve)
+        app.jinja_env.globals.update(asset_url=asset_url, bundle_urls=bundle_urls)
+
+    def lookup(self, name):
+        if self.manifest is None:
+            path = os.path.join(current_app.static_folder, DIST_DIR, MANIFEST)
+            try:
+                with open(path) as f:
+                    self.manifest = json.load(f)
+            except FileNotFoundError:
+                self.manifest = {}
+        return self.manifest.get(name)
+
+    def serve(self, filename):
+        directory = os.path.join(current_app.static_folder, DIST_DIR)
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        hashed = HASHED_NAME.search(filename) is not None
+        max_age = FAR_FUTURE if hashed else 0
+        accepted = request.accept_encodings
+        for encoding, suffix in ENCODINGS:
+            if accepted[encoding] and os.path.isfile(os.path.join(directory, filename + suffix)):
+                response = send_from_directory(directory, filename + suffix,
+                                               mimetype=mimetype, max_age=max_age)
+                response.content_encoding = encoding
+                break
+        else:
+            response = send_from_directory(directory, filename, mimetype=mimetype, max_age=max_age)
+        response.vary.add('Accept-Encoding')
+        if hashed:
+            response.cache_control.immutable = True
+        else:
+            # revalidated on every use, against its ETag
+            response.cache_control.no_cache = True
+        return response
+
+
+def asset_url(filename, **values):
+    # url_for('static', filename=...) that prefers the built, hashed file
+    hashed = current_app.extensions['assets'].lookup(filename)
+    if hashed is not None:
+        return url_for('dist', filename=hashed, **values)
+    return url_for('static', filename=filename, **values)
+
+
+def bundle_urls(name):
+    # the built bundle, or its source files when nothing has been built
+    hashed = current_app.extensions['assets'].lookup(name)
+    if hashed is not None:
+        return [url_for('dist', filename=hashed)]
+    return [url_for('static', filename=source) for source in BUNDLES[name]]
+
+
+assets_cli = AppGroup('assets', help='Build the static asset bundles.')
+
+
+@assets_cli.command('build')
+def build_command():
+    """Bundle, fingerprint and precompress the CSS and JS in static/."""
+    for name, (hashed, size, gz, br) in build(current_app).items():
+        sizes = f'{size} bytes, gzip {gz}' + (f', brotli {br}' if br is not None else '')
+        click.echo(f'{name} -> {DIST_DIR}/{hashed} ({sizes})')
+    if brotli is None:
+        click.echo('brotli is not installed; only gzip variants were written', err=True)
@@ -0,0 +1,123 @@
+import bisect
+from collections import namedtuple
+
+from sqlalchemy import select
+
+from background_index import BackgroundIndex
+from models import Artist, Venue, db
+
+# Search-as-you-type over venue and artist names.
+#
+# Each worker keeps a PrefixIndex: one sorted list of (key, kind, id) tuples
+# where the keys are a name and every tail of it starting at a word, folded
+# to lower case, so 'hop' finds "The Musical Hop". A prefix lookup is a
+# bisect to the first key >= the prefix and a walk while keys still start
+# with it. The index is loaded on first use and kept current by the create,
+# edit and delete handlers; it is reloaded in the background every
+# AUTOCOMPLETE_TTL seconds to pick up other workers' writes (see
+# background_index.py).
+
+AUTOCOMPLETE_LIMIT = 10
+MAX_AUTOCOMPLETE_LIMIT = 50
+KINDS = {'venue': Venue, 'artist': Artist}
+
+Suggestion = namedtuple('Suggestion', ['kind', 'id', 'name'])
+
+
+def fold(text):
+    return ' '.join((text or '').casefold().split())
+
+
+def _keys(name):
+    words = fold(name).split(' ')
+    return {' '.join(words[i:]) for i in range(len(words)) if words[i]}
+
+
+class PrefixIndex:
+    def __init__(self):
+        self._entries = []
+        self._names = {}
+
+    def __len__(self):
+        return len(self._names)
+
+    def add(self, kind, doc_id, name):
+        self.remove(kind, doc_id)
+        self._names[kind, doc_id] = name
+        for key in _keys(name):
+            bisect.insort(self._entries, (key, kind, doc_id))
+
+    def load(self, docs):
+        # bulk form of add() for (kind, id, name) rows: one sort instead of
+        # an insort per key
+        for kind, doc_id, name in docs:
+            self._names[kind, doc_id] = name
+            self._entries.extend((key, kind, doc_id) for key in _keys(name))
+        self._entries.sort()
+
+    def remove(self, kind, doc_id):
+        name = self._names.pop((kind, doc_id), None)
+        if name is None:
+            return
+        for key in _keys(name):
+            i = bisect.bisect_left(self._entries, (key, kind, doc_id))
+            if i < len(self._entries) and self._entries[i] == (key, kind, doc_id):
+                del self._entries[i]
+
+    def complete(self, prefix, limit=AUTOCOMPLETE_LIMIT, kind=None):
+        # the first `limit` matches in key order, whole-name matches first
+        prefix = fold(prefix)
+        if not prefix:
+            return []
+        whole, partial, seen = [], [], set()
+        i = bisect.bisect_left(self._entries, (prefix,))
+        while i < len(self._entries) and len(whole) + len(partial) < limit:
+            key, entry_kind, doc_id = self._entries[i]
+            i += 1
+            if not key.startswith(prefix):
+                break
+            if (kind is not None and entry_kind != kind) or (entry_kind, doc_id) in seen:
+                continue
+            seen.add((entry_kind, doc_id))
+            name = self._names[entry_kind, doc_id]
+            target = whole if fold(name) == key else partial
+            target.append(Suggestion(entry_kind, doc_id, name))
+        return whole + partial
+
+
+def build_index():
+    index = PrefixIndex()
+    for kind, model in KINDS.items():
+        rows = db.session.execute(select(model.id, model.name))
+        index.load((kind, doc_id, name) for doc_id, name in rows)
+    return index
+
+
+# built in the request on first use
+_index = BackgroundIndex('autocomplete-index', build_index, 'AUTOCOMPLETE_TTL',
+                         build_first_in_request=True)
+
+
+def current_index():
+    return _index.current()
+
+
+def update(kind, doc_id, name):
+    # keeps this worker's index current after a venue or artist write
+    _index.apply(lambda index: index.add(kind, doc_id, name))
+
+
+def discard(kind, *doc_ids):
+    def remove(index):
+        for doc_id in doc_ids:
+            index.remove(kind, doc_id)
+    _index.apply(remove)
+
+
+def invalidate():
+    _index.invalidate()
+
+
+def complete(prefix, limit=AUTOCOMPLETE_LIMIT, kind=None):
+    limit = max(1, min(limit, MAX_AUTOCOMPLETE_LIMIT))
+    return current_index().complete(prefix, limit, kind)
@@ -0,0 +1,87 @@
+import threading
+import time
+
+from flask import current_app
+
+# Per-worker in-memory indexes rebuilt in the background.
+#
+# geo.py and autocomplete.py each keep an index of every venue (and artist)
+# in the worker. The request handlers keep it current for the worker's own
+# writes through apply(); to pick up other workers' writes it is rebuilt from
+# the database in a background thread once it is older than its TTL, and the
+# stale index keeps serving until the new one is swapped in. Changes applied
+# while a build runs are recorded and replayed on the new index before the
+# swap, since its snapshot may predate them (they are idempotent, so
+# replaying one the snapshot already has is harmless). invalidate() bumps a
+# generation counter, and a build started before it is thrown away.
+
+
+class BackgroundIndex:
+    def __init__(self, name, build, ttl_setting, default_ttl=300, build_first_in_request=False):
+        # build() runs in an app context and returns a new index;
+        # build_first_in_request builds the first index in the request
+        # instead of returning None until the background build is done
+        self.name = name
+        self.build = build
+        self.ttl_setting = ttl_setting
+        self.default_ttl = default_ttl
+        self.build_first_in_request = build_first_in_request
+        self.index = None
+        self._built_at = 0.0
+        self._building = False
+        self._generation = 0
+        self._recorders = []
+        self._lock = threading.Lock()
+
+    def current(self):
+        # the worker's index, or None while the first build is running
+        index = self.index
+        if index is None and self.build_first_in_request:
+            return self._build()
+        ttl = current_app.config.get(self.ttl_setting, self.default_ttl)
+        if index is None or time.time() - self._built_at > ttl:
+            with self._lock:
+                start = not self._building
+                self._building = True
+            if start:
+                threading.Thread(target=self._rebuild, args=(current_app._get_current_object(),),
+                                 name=self.name, daemon=True).start()
+        return index
+
+    def _rebuild(self, app):
+        try:
+            with app.app_context():
+                self._build()
+        finally:
+            self._building = False
+
+    def _build(self):
+        changes = []
+        with self._lock:
+            generation = self._generation
+            self._recorders.append(changes)
+        try:
+            index = self.build()
+        finally:
+            with self._lock:
+                self._recorders.remove(changes)
+        with self._lock:
+            for change in changes:
+                change(index)
+            if generation == self._generation:
+                self.index, self._built_at = index, time.time()
+        return index
+
+    def apply(self, change):
+        # change(index) after a write by this worker
+        with self._lock:
+            if self.index is not None:
+                change(self.index)
+            for changes in self._recorders:
+                changes.append(change)
+
+    def invalidate(self):
+        # after bulk writes; the next use builds from the database again
+        with self._lock:
+            self._generation += 1
+            self.index = None
@@ -0,0 +1,369 @@
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import event, func
+from sqlalchemy.engine import Engine
+
+from bulk import delete_entities, invalidate_caches
+from models import Artist, Venue, db
+from seed import CITIES, bulk_insert, generate_venues
+
+# Per-route benchmark through the Flask test client. Each route is hit
+# --requests times against whatever data is in the database (see
+# `flask seed`) and reported as latency percentiles plus SQL statements per
+# request, so regressions show up as numbers.
+
+
+class StatementCounter:
+    # counts statements issued by the calling thread only, so concurrent
+    # benchmark threads do not inflate each other's numbers
+    def __init__(self):
+        self.count = 0
+        self.thread = threading.get_ident()
+
+    def __call__(self, *args):
+        if threading.get_ident() == self.thread:
+            self.count += 1
+
+    def __enter__(self):
+        event.listen(Engine, 'before_cursor_execute', self)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(Engine, 'before_cursor_execute', self)
+
+
+BATCH_SHOWS = 5
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _venue_form(rng):
+    n = rng.randint(0, 10 ** 6)
+    return {
+        'name': f'Bench Venue {n}', 'city': 'San Francisco', 'state': 'CA',
+        'address': '1015 Folsom Street', 'phone': '4155551234',
+        'genres': ['Jazz', 'Blues'], 'facebook_link': 'https://www.facebook.com/bench',
+        'image_link': '', 'website_link': '', 'seeking_description': '',
+    }
+
+
+def _artist_form(rng):
+    n = rng.randint(0, 10 ** 6)
+    return {
+        'name': f'Bench Artist {n}', 'city': 'San Francisco', 'state': 'CA',
+        'phone': '4155551234', 'genres': ['Jazz'],
+        'facebook_link': 'https://www.facebook.com/bench',
+        'image_link': '', 'website_link': '', 'seeking_description': '',
+    }
+
+
+def _show_form(rng, venue_ids, artist_ids):
+    start = datetime.now() + timedelta(days=rng.randint(1, 365), hours=rng.randint(0, 23))
+    return {
+        'artist_id': str(rng.choice(artist_ids)),
+        'venue_id': str(rng.choice(venue_ids)),
+        'start_time': start.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+
+
+def routes(rng, venue_ids, artist_ids, edited_venue_id, edited_artist_id):
+    # (label, method, url factory, body factory); a body is form data, or a
+    # JSON body when it is a list. The edit routes only ever rename the
+    # bench's own venue and artist.
+    venue = lambda: rng.choice(venue_ids)
+    artist = lambda: rng.choice(artist_ids)
+    city = lambda: '&'.join(f'{k}={v}' for k, v in zip(('city', 'state'), rng.choice(CITIES)))
+    return [
+        ('GET /', 'GET', lambda: '/', None),
+        ('GET /venues', 'GET', lambda: '/venues', None),
+        ('GET /artists', 'GET', lambda: '/artists', None),
+        ('GET /shows', 'GET', lambda: '/shows', None),
+        ('GET /venues/<id>', 'GET', lambda: f'/venues/{venue()}', None),
+        ('GET /artists/<id>', 'GET', lambda: f'/artists/{artist()}', None),
+        ('GET /venues/<id>/edit', 'GET', lambda: f'/venues/{venue()}/edit', None),
+        ('GET /artists/<id>/edit', 'GET', lambda: f'/artists/{artist()}/edit', None),
+        ('GET /venues/create', 'GET', lambda: '/venues/create', None),
+        ('GET /artists/create', 'GET', lambda: '/artists/create', None),
+        ('GET /shows/create', 'GET', lambda: '/shows/create', None),
+        ('GET /api/venues', 'GET', lambda: '/api/venues', None),
+        ('GET /api/artists', 'GET', lambda: '/api/artists', None),
+        ('GET /api/shows', 'GET', lambda: '/api/shows', None),
+        ('GET /api/shows/range', 'GET', lambda: '/api/shows/range', None),
+        ('GET /api/shows/range?venue_id', 'GET', lambda: f'/api/shows/range?venue_id={venue()}', None),
+        ('GET /venues/nearby', 'GET', lambda: f'/venues/nearby?{city()}', None),
+        ('GET /autocomplete', 'GET',
+         lambda: f'/autocomplete?q={rng.choice(["the", "blue", "wild", "sax", "neon"])}', None),
+        ('GET /venues/<id>/calendar.ics', 'GET', lambda: f'/venues/{venue()}/calendar.ics', None),
+        ('GET /artists/<id>/calendar.ics', 'GET', lambda: f'/artists/{artist()}/calendar.ics', None),
+        ('POST /venues/search', 'POST', lambda: '/venues/search',
+         lambda: {'search_term': rng.choice(['the', 'blue', 'hall', 'jazz', 'san'])}),
+        ('POST /artists/search', 'POST', lambda: '/artists/search',
+         lambda: {'search_term': rng.choice(['the', 'wild', 'sax', 'rock', 'new'])}),
+        ('POST /venues/create', 'POST', lambda: '/venues/create', lambda: _venue_form(rng)),
+        ('POST /artists/create', 'POST', lambda: '/artists/create', lambda: _artist_form(rng)),
+        ('POST /shows/create', 'POST', lambda: '/shows/create',
+         lambda: _show_form(rng, venue_ids, artist_ids)),
+        ('POST /shows/batch', 'POST', lambda: '/shows/batch',
+         lambda: [_show_form(rng, venue_ids, artist_ids) for _ in range(BATCH_SHOWS)]),
+        ('POST /venues/<id>/edit', 'POST', lambda: f'/venues/{edited_venue_id}/edit',
+         lambda: _venue_form(rng)),
+        ('POST /artists/<id>/edit', 'POST', lambda: f'/artists/{edited_artist_id}/edit',
+         lambda: _artist_form(rng)),
+    ]
+
+
+def _timed_request(app, method, url, data):
+    client = app.test_client()
+    with StatementCounter() as counter:
+        started = time.perf_counter()
+        if isinstance(data, list):
+            response = client.open(url, method=method, json=data)
+        else:
+            response = client.open(url, method=method, data=data)
+        response.get_data()
+        elapsed = (time.perf_counter() - started) * 1000
+    return elapsed, counter.count, response.status_code
+
+
+def run_benchmark(app, requests, only=None, concurrency=1, random_seed=0):
+    rng = random.Random(random_seed)
+    venue_ids = [i for (i,) in db.session.query(Venue.id).limit(10000)]
+    artist_ids = [i for (i,) in db.session.query(Artist.id).limit(10000)]
+    if not venue_ids or not artist_ids:
+        raise click.ClickException('No venues or artists to benchmark against; run `flask seed` first.')
+
+    edited_venue, edited_artist = _edited_entities(rng)
+    results = []
+    try:
+        with ThreadPoolExecutor(concurrency) as pool:
+            for label, method, url, data in routes(rng, venue_ids, artist_ids,
+                                                   edited_venue.id, edited_artist.id):
+                if only and only not in label:
+                    continue
+                calls = [(method, url(), data() if data else None) for _ in range(requests)]
+                started = time.perf_counter()
+                samples = list(pool.map(lambda call: _timed_request(app, *call), calls))
+                wall = time.perf_counter() - started
+                timings = sorted(sample[0] for sample in samples)
+                statements = [sample[1] for sample in samples]
+                statuses = {sample[2] for sample in samples}
+                results.append(_summary(label, requests, wall, timings, statements, statuses))
+    finally:
+        _delete_edited_entities(edited_venue.id, edited_artist.id)
+    return results
+
+
+def _edited_entities(rng):
+    # a venue and an artist of the bench's own for the edit routes to rename
+    venue = Venue(**_venue_form(rng))
+    artist = Artist(**_artist_form(rng))
+    db.session.add_all([venue, artist])
+    db.session.commit()
+    return venue, artist
+
+
+def _delete_edited_entities(venue_id, artist_id):
+    db.session.rollback()
+    venue_keys = delete_entities(Venue, [venue_id])
+    artist_keys = delete_entities(Artist, [artist_id])
+    db.session.commit()
+    invalidate_caches(Venue, venue_keys)
+    invalidate_caches(Artist, artist_keys)
+
+
+def _summary(label, requests, wall, timings, statements, statuses):
+    return {
+        'route': label,
+        'requests': requests,
+        'rps': round(requests / wall, 1),
+        'p50_ms': round(percentile(timings, 0.5), 2),
+        'p90_ms': round(percentile(timings, 0.9), 2),
+        'p99_ms': round(percentile(timings, 0.99), 2),
+        'max_ms': round(timings[-1], 2),
+        'sql_per_request': round(sum(statements) / len(statements), 1),
+        'statuses': sorted(statuses),
+    }
+
+
+@click.command('bench')
+@click.option('--requests', default=20, show_default=True, help='Requests per route.')
+@click.option('--route', 'only', help='Only run routes whose label contains this text.')
+@click.option('--page-cache/--no-page-cache', default=False, show_default=True,
+              help='Serve detail pages from the page cache while benchmarking.')
+@click.option('--concurrency', default=1, show_default=True,
+              help='Requests in flight at once, to measure throughput per worker.')
+@click.option('--async-reads/--sync-reads', default=None,
+              help='Force the async or the sync read path (default: as configured).')
+@click.option('--json', 'as_json', is_flag=True, help='Print results as JSON.')
+@with_appcontext
+def bench_command(requests, only, page_cache, concurrency, async_reads, as_json):
+    """Benchmark every route through the test client."""
+    app = current_app._get_current_object()
+    app.config['WTF_CSRF_ENABLED'] = False
+    cache = app.extensions['page_cache']
+    backend = cache.backend
+    if not page_cache:
+        cache.backend = None
+    reads = app.extensions.get('async_reads')
+    if reads is None and async_reads is not None:
+        from aio import AsyncReads
+        reads = AsyncReads(app)
+    if async_reads is True:
+        reads.install(app)
+    elif async_reads is False:
+        reads.uninstall(app)
+    try:
+        results = run_benchmark(app, requests, only, concurrency)
+    finally:
+        cache.backend = backend
+
+    if as_json:
+        click.echo(json.dumps(results, indent=2))
+        return
+    click.echo(f'{"route":<32}{"req/s":>9}{"p50":>9}{"p90":>9}{"p99":>9}{"max":>9}{"sql":>7}  status')
+    for r in results:
+        click.echo(f'{r["route"]:<32}{r["rps"]:>9}{r["p50_ms"]:>9}{r["p90_ms"]:>9}{r["p99_ms"]:>9}'
+                   f'{r["max_ms"]:>9}{r["sql_per_request"]:>7}  {",".join(map(str, r["statuses"]))}')
+
+
+#  Area listing at scale
+#  ----------------------------------------------------------------
+#
+#  `flask bench-areas` grows the venue table in steps, timing GET /venues
+#  and counting its statements at each size; the page is one grouped query,
+#  so the count has to stay the same however many venues there are. The
+#  venues it adds are deleted again afterwards.
+
+AREA_SIZES = (100, 1000, 10000)
+
+
+def bench_areas(app, sizes, requests, random_seed=0):
+    rng = random.Random(random_seed)
+    first_id = (db.session.query(func.max(Venue.id)).scalar() or 0) + 1
+    results = []
+    added = 0
+    try:
+        for size in sorted(sizes):
+            added += bulk_insert(Venue, generate_venues(rng, size - added), 5000)
+            invalidate_caches(Venue, [])
+            # the first request after a write warms what the page reads
+            _timed_request(app, 'GET', '/venues', None)
+            samples = [_timed_request(app, 'GET', '/venues', None) for _ in range(requests)]
+            results.append({
+                'venues': db.session.query(func.count(Venue.id)).scalar(),
+                'p50_ms': round(percentile(sorted(sample[0] for sample in samples), 0.5), 2),
+                'statements': sorted({sample[1] for sample in samples}),
+                'statuses': sorted({sample[2] for sample in samples}),
+            })
+    finally:
+        db.session.rollback()
+        ids = [i for (i,) in db.session.query(Venue.id).filter(Venue.id >= first_id)]
+        keys = delete_entities(Venue, ids)
+        db.session.commit()
+        invalidate_caches(Venue, keys)
+    return results
+
+
+@click.command('bench-areas')
+@click.option('--size', 'sizes', type=int, multiple=True, default=AREA_SIZES, show_default=True,
+              help='Venues added before each measurement; repeat for more steps.')
+@click.option('--requests', default=20, show_default=True, help='Requests per step.')
+@with_appcontext
+def bench_areas_command(sizes, requests):
+    """Time GET /venues as the venue table grows."""
+    app = current_app._get_current_object()
+    results = bench_areas(app, sizes, requests)
+    click.echo(f'{"venues":>8}{"p50":>9}{"sql":>7}  status')
+    for r in results:
+        click.echo(f'{r["venues"]:>8}{r["p50_ms"]:>9}{",".join(map(str, r["statements"])):>7}'
+                   f'  {",".join(map(str, r["statuses"]))}')
+    counts = {count for r in results for count in r['statements']}
+    if len(counts) > 1:
+        raise click.ClickException(f'GET /venues issued {sorted(counts)} statements across sizes.')
+
+
+#  Show tiles
+#  ----------------------------------------------------------------
+#
+#  `flask bench-tiles` renders pages/shows.html with synthetic show rows,
+#  once with the datetime filter as it was (dateutil parse, then Babel
+#  parsing the pattern on every call) and once with the app's filter, cold
+#  (empty LRU) and warm.
+
+TILE_COUNT = 10000
+
+
+def _original_format_datetime(value, format='medium'):
+    import babel.dates
+    import dateutil.parser
+    date = dateutil.parser.parse(str(value))
+    if format == 'full':
+        format = "EEEE MMMM, d, y 'at' h:mma"
+    elif format == 'medium':
+        format = "EE MM, dd, y h:mma"
+    return babel.dates.format_datetime(date, format, locale='en')
+
+
+def _tiles(rng, count):
+    now = datetime.now().replace(minute=0, second=0, microsecond=0)
+    return [{
+        'venue_id': rng.randint(1, 1000),
+        'venue_name': f'Bench Venue {i}',
+        'artist_id': rng.randint(1, 2000),
+        'artist_name': f'Bench Artist {i}',
+        'artist_image_link': f'https://picsum.photos/seed/artist{i}/400/300',
+        'start_time': now + timedelta(hours=rng.randint(-365 * 24, 365 * 24)),
+    } for i in range(count)]
+
+
+def bench_tiles(app, count, random_seed=0):
+    from flask import render_template
+
+    from app import _format_datetime
+
+    shows = _tiles(random.Random(random_seed), count)
+    filters = app.jinja_env.filters
+    app_filter = filters['datetime']
+
+    def render(label):
+        with app.test_request_context('/shows'):
+            started = time.perf_counter()
+            render_template('pages/shows.html', shows=shows)
+            return {'filter': label, 'tiles': count,
+                    'ms': round((time.perf_counter() - started) * 1000, 1)}
+
+    results = []
+    try:
+        # the template is compiled before any timing
+        filters['datetime'] = _original_format_datetime
+        render('warm-up')
+        results.append(render('original'))
+        filters['datetime'] = app_filter
+        _format_datetime.cache_clear()
+        results.append(render('app (cold)'))
+        results.append(render('app (warm)'))
+    finally:
+        filters['datetime'] = app_filter
+    return results
+
+
+@click.command('bench-tiles')
+@click.option('--tiles', default=TILE_COUNT, show_default=True, help='Show tiles rendered.')
+@with_appcontext
+def bench_tiles_command(tiles):
+    """Time pages/shows.html with the original and the current datetime filter."""
+    results = bench_tiles(current_app._get_current_object(), tiles)
+    click.echo(f'{"filter":<14}{"tiles":>8}{"ms":>10}')
+    for r in results:
+        click.echo(f'{r["filter"]:<14}{r["tiles"]:>8}{r["ms"]:>10}')
@@ -0,0 +1,112 @@
+import bisect
+from datetime import timedelta
+
+from sqlalchemy.exc import IntegrityError
+
+from models import MAX_SHOW_MINUTES, Show, db
+
+# Booking conflicts: a venue or an artist cannot hold two shows whose
+# [start_time, start_time + duration) ranges overlap.
+#
+# On PostgreSQL the exclusion constraints on show enforce this, backed by
+# GiST indexes. The checks below run before writing so the user gets a
+# specific message, and they are the only guard on other databases. Since
+# no show is longer than MAX_SHOW_MINUTES, only shows starting within
+# [start - MAX_SHOW_MINUTES, end) can overlap a candidate; those are loaded
+# with one range query on the (venue_id, start_time) and
+# (artist_id, start_time) indexes and checked in memory.
+
+MAX_DURATION = timedelta(minutes=MAX_SHOW_MINUTES)
+EXCLUSION_VIOLATION = '23P01'
+
+
+def show_end(start_time, duration_minutes):
+    return start_time + timedelta(minutes=duration_minutes)
+
+
+class IntervalIndex:
+    # Busy time per key as disjoint [start, end) intervals sorted by start.
+    # Disjoint intervals sorted by start are sorted by end as well, so both
+    # checking and adding are two bisects; overlapping intervals added
+    # through add() are merged to keep it that way.
+    def __init__(self):
+        self._starts = {}
+        self._ends = {}
+
+    def _span(self, key, start, end):
+        # indexes [i, j) of the intervals overlapping [start, end)
+        starts = self._starts.setdefault(key, [])
+        ends = self._ends.setdefault(key, [])
+        return starts, ends, bisect.bisect_right(ends, start), bisect.bisect_left(starts, end)
+
+    def conflicts(self, key, start, end):
+        _, _, i, j = self._span(key, start, end)
+        return i < j
+
+    def add(self, key, start, end):
+        starts, ends, i, j = self._span(key, start, end)
+        if i < j:
+            start = min(start, starts[i])
+            end = max(end, ends[j - 1])
+            del starts[i:j]
+            del ends[i:j]
+        starts.insert(i, start)
+        ends.insert(i, end)
+
+
+class ScheduleChecker:
+    # Checks candidate shows against the stored shows of the same venues and
+    # artists and against each other, e.g. a batch of imported rows.
+    def __init__(self):
+        self.index = IntervalIndex()
+
+    @classmethod
+    def load(cls, shows):
+        # shows: candidate dicts with venue_id, artist_id, start_time and
+        # duration_minutes; one query loads everything they could overlap
+        checker = cls()
+        shows = list(shows)
+        if not shows:
+            return checker
+        venue_ids = {show['venue_id'] for show in shows}
+        artist_ids = {show['artist_id'] for show in shows}
+        since = min(show['start_time'] for show in shows) - MAX_DURATION
+        until = max(show_end(show['start_time'], show['duration_minutes']) for show in shows)
+        stored = db.session.query(
+            Show.venue_id, Show.artist_id, Show.start_time, Show.duration_minutes
+        ).filter(
+            db.or_(Show.venue_id.in_(venue_ids), Show.artist_id.in_(artist_ids)),
+            Show.start_time >= since,
+            Show.start_time < until)
+        for venue_id, artist_id, start_time, duration_minutes in stored:
+            checker.add(venue_id, artist_id, start_time, duration_minutes)
+        return checker
+
+    def add(self, venue_id, artist_id, start_time, duration_minutes):
+        end = show_end(start_time, duration_minutes)
+        self.index.add(('venue', venue_id), start_time, end)
+        self.index.add(('artist', artist_id), start_time, end)
+
+    def check(self, venue_id, artist_id, start_time, duration_minutes):
+        # Returns form-style errors, or {} after reserving the slot.
+        end = show_end(start_time, duration_minutes)
+        errors = {}
+        if self.index.conflicts(('venue', venue_id), start_time, end):
+            errors['venue_id'] = ['Venue is already booked at that time']
+        if self.index.conflicts(('artist', artist_id), start_time, end):
+            errors['artist_id'] = ['Artist is already booked at that time']
+        if not errors:
+            self.add(venue_id, artist_id, start_time, duration_minutes)
+        return errors
+
+
+def booking_conflicts(venue_id, artist_id, start_time, duration_minutes):
+    show = {'venue_id': venue_id, 'artist_id': artist_id,
+            'start_time': start_time, 'duration_minutes': duration_minutes}
+    return ScheduleChecker.load([show]).check(venue_id, artist_id, start_time, duration_minutes)
+
+
+def is_booking_conflict(error):
+    # an insert rejected by one of the PostgreSQL exclusion constraints
+    return isinstance(error, IntegrityError) and \
+        getattr(error.orig, 'pgcode', None) == EXCLUSION_VIOLATION
@@ -0,0 +1,122 @@
+import json
+import os
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import select
+
+from api import json_default
+import autocomplete
+from counters import detach_shows
+from models import Artist, Show, Venue, db
+import geo
+import search
+
+# Set-based deletes of venues and artists.
+#
+# Shows reference their venue and artist with ON DELETE CASCADE, so removing
+# any number of entities is one DELETE ... WHERE id IN (...) plus one UPDATE
+# of the counters on the other side; no show is loaded into the session, and
+# the cost does not depend on how many shows an entity has. Archiving streams
+# the entities and their shows to a JSON lines file in the same transaction
+# before deleting them.
+
+KINDS = {
+    'venues': (Venue, Show.venue_id),
+    'artists': (Artist, Show.artist_id),
+}
+BATCH_SIZE = 1000
+
+
+def delete_entities(model, ids):
+    # Returns the page cache keys of every venue and artist affected; the
+    # caller commits.
+    ids = list(ids)
+    if not ids:
+        return set()
+    keys = detach_shows(model, ids)
+    db.session.query(model).filter(model.id.in_(ids)).delete(synchronize_session=False)
+    prefix = model.__tablename__.lower()
+    return keys | {f'{prefix}:{entity_id}' for entity_id in ids}
+
+
+def _write_rows(f, table, stmt):
+    written = 0
+    result = db.session.execute(stmt.execution_options(stream_results=True, yield_per=BATCH_SIZE))
+    for row in result:
+        f.write(json.dumps({'table': table, 'row': row._asdict()}, default=json_default) + '\n')
+        written += 1
+    return written
+
+
+def archive_entities(model, fk, ids, path):
+    # Writes the entities and their shows to path, then deletes them. The
+    # file only appears under its final name once the delete has committed.
+    ids = list(ids)
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        entities = _write_rows(f, model.__tablename__, select(*model.__table__.columns).where(
+            model.id.in_(ids)).order_by(model.id))
+        shows = _write_rows(f, Show.__tablename__, select(*Show.__table__.columns).where(
+            fk.in_(ids)).order_by(Show.id))
+    try:
+        keys = delete_entities(model, ids)
+        db.session.commit()
+    except BaseException:
+        db.session.rollback()
+        os.remove(tmp)
+        raise
+    os.replace(tmp, path)
+    return entities, shows, keys
+
+
+def invalidate_caches(model, keys):
+    # after venues or artists were deleted, or written outside the request
+    # handlers: the worker's search, autocomplete, recent and nearby indexes
+    # of the model, and the page cache entries in keys
+    search.invalidate(model)
+    autocomplete.invalidate()
+    current_app.extensions['recent_listings'].invalidate()
+    if model is Venue:
+        geo.invalidate()
+    current_app.extensions['page_cache'].invalidate(*keys)
+
+
+def _ids(ids, ids_file):
+    ids = list(ids)
+    if ids_file is not None:
+        ids.extend(int(line) for line in ids_file if line.strip())
+    if not ids:
+        raise click.UsageError('No ids given.')
+    return ids
+
+
+bulk_cli = AppGroup('bulk', help='Delete or archive many venues or artists at once.')
+
+
+@bulk_cli.command('delete')
+@click.argument('kind', type=click.Choice(sorted(KINDS)))
+@click.argument('ids', nargs=-1, type=int)
+@click.option('--ids-file', type=click.File(), help='File with one id per line.')
+def delete_command(kind, ids, ids_file):
+    """Delete venues or artists, with their shows, in one transaction."""
+    model, _ = KINDS[kind]
+    ids = _ids(ids, ids_file)
+    keys = delete_entities(model, ids)
+    db.session.commit()
+    invalidate_caches(model, keys)
+    click.echo(f'{kind}: {len(ids)} deleted')
+
+
+@bulk_cli.command('archive')
+@click.argument('kind', type=click.Choice(sorted(KINDS)))
+@click.argument('path', type=click.Path(dir_okay=False, writable=True))
+@click.argument('ids', nargs=-1, type=int)
+@click.option('--ids-file', type=click.File(), help='File with one id per line.')
+def archive_command(kind, path, ids, ids_file):
+    """Write venues or artists and their shows to PATH as JSON lines, then delete them."""
+    model, fk = KINDS[kind]
+    entities, shows, keys = archive_entities(model, fk, _ids(ids, ids_file), path)
+    invalidate_caches(model, keys)
+    click.echo(f'{kind}: {entities} archived with {shows} shows to {path}')
@@ -0,0 +1,177 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, session
+from werkzeug.local import LocalProxy
+
+from models import Artist, Show, Venue, db
+
+# Rendered-page cache for the venue and artist detail pages.
+#
+# Entries are keyed by entity ("venue:3", "artist:7") and carry an expiry
+# timestamp: when the page's next upcoming show starts, and at most
+# PAGE_CACHE_TTL seconds after the page was rendered. Write handlers
+# invalidate the affected keys explicitly, including the pages of the
+# venues or artists that show an edited entity on their show tiles.
+
+
+def page_is_cacheable():
+    # False without a cache backend, so the views only pin a miss to the
+    # primary when a page cache is there to fill. Flashed messages are
+    # rendered into the page, so requests carrying them neither read from
+    # nor populate the page cache.
+    return current_page_cache.backend is not None and '_flashes' not in session
+
+
+def next_show_time(upcoming_shows):
+    # a detail page goes stale once its next upcoming show moves into the past
+    return min((show.start_time for show in upcoming_shows), default=None)
+
+
+def page_keys(model, entity_id):
+    # the entity's own page and the pages of every venue or artist it shares
+    # a show with, whose show tiles carry its name and picture
+    fk, other_fk, other = {
+        Venue: (Show.venue_id, Show.artist_id, 'artist'),
+        Artist: (Show.artist_id, Show.venue_id, 'venue'),
+    }[model]
+    others = db.session.query(other_fk).filter(fk == entity_id).distinct()
+    return [f'{model.__tablename__.lower()}:{entity_id}'] + \
+        [f'{other}:{other_id}' for (other_id,) in others]
+
+
+class MemoryBackend:
+    # Per-process LRU.
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DiskBackend:
+    # One pickle file per key, shared by every worker on the host. Files are
+    # written to a temporary name and renamed so readers never see a partial
+    # entry.
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest())
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                return pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def set(self, key, entry):
+        fd, tmp = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(entry, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self._path(key))
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def __len__(self):
+        return sum(1 for name in os.listdir(self.directory) if not name.startswith('tmp'))
+
+
+# the app's PageCache, for blueprints that cannot hold a reference to it
+current_page_cache = LocalProxy(lambda: current_app.extensions['page_cache'])
+
+
+class PageCache:
+    def __init__(self, app=None):
+        self.backend = None
+        self.ttl = None
+        self.hits = 0
+        self.misses = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        backend = app.config.get('PAGE_CACHE_BACKEND')
+        if backend == 'memory':
+            self.backend = MemoryBackend(app.config.get('PAGE_CACHE_MAX_ENTRIES', 1024))
+        elif backend == 'disk':
+            self.backend = DiskBackend(app.config['PAGE_CACHE_DIR'])
+        elif backend is not None:
+            raise ValueError(f'Unknown PAGE_CACHE_BACKEND {backend!r}')
+        self.ttl = app.config.get('PAGE_CACHE_TTL')
+        app.extensions['page_cache'] = self
+
+    def get(self, key, version=None):
+        # version: what the page is rendered from (its ETag); an entry
+        # stored under another version is a miss
+        if self.backend is None:
+            return None
+        entry = self.backend.get(key)
+        if entry is not None and len(entry) == 3:
+            body, expires_at, stored_version = entry
+            if expires_at is not None and expires_at <= time.time():
+                self.backend.delete(key)
+            elif stored_version == version:
+                self.hits += 1
+                return body
+        self.misses += 1
+        return None
+
+    def set(self, key, body, expires_at=None, version=None):
+        # expires_at is a naive local datetime, as stored in Show.start_time
+        if self.backend is None:
+            return
+        if expires_at is not None:
+            expires_at = expires_at.timestamp()
+        if self.ttl:
+            ttl_at = time.time() + self.ttl
+            expires_at = ttl_at if expires_at is None else min(expires_at, ttl_at)
+        self.backend.set(key, (body, expires_at, version))
+
+    def invalidate(self, *keys):
+        if self.backend is None:
+            return
+        for key in keys:
+            self.backend.delete(key)
+
+    def stats(self):
+        # entries are counted in the backend, which with 'disk' is shared by
+        # every worker on the host; hits and misses are this worker's own
+        return {
+            'backend': type(self.backend).__name__ if self.backend is not None else None,
+            'entries': len(self.backend) if self.backend is not None else 0,
+            'worker': {'pid': os.getpid(), 'hits': self.hits, 'misses': self.misses},
+        }
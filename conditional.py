@@ -0,0 +1,121 @@
+import hashlib
+import os
+from datetime import date, datetime
+from functools import wraps
+
+from flask import current_app, g, make_response, request
+from werkzeug.http import is_resource_modified
+
+from assets import DIST_DIR, MANIFEST
+from cache import page_is_cacheable
+from models import Artist, Show, Venue, db
+import queries
+
+# Conditional GET for the listing and detail pages.
+#
+# A validator runs one small query (max(updated_at) and row counts, see
+# queries.table_version / entity_version) and its result is hashed into an
+# ETag together with the templates' version. When the browser already holds
+# that version the view answers 304 Not Modified without running its own
+# queries or rendering anything. Responses carry Cache-Control: no-cache so
+# browsers revalidate on every visit instead of showing stale pages.
+#
+# There is no Last-Modified: deleting a row never moves max(updated_at), so
+# If-Modified-Since would answer 304 for a page that lost a show. The ETag
+# is also the version the page cache stores a rendered body under, so a
+# cached body is only served for the state it was rendered from.
+
+
+def _template_version(app):
+    # newest template or asset manifest mtime, so a deploy that only changes
+    # templates or static bundles still changes every ETag
+    version = app.extensions.get('template_version')
+    if version is None:
+        version = 0
+        for root, _, files in os.walk(os.path.join(app.root_path, app.template_folder)):
+            for name in files:
+                version = max(version, os.path.getmtime(os.path.join(root, name)))
+        manifest = os.path.join(app.static_folder, DIST_DIR, MANIFEST)
+        if os.path.exists(manifest):
+            version = max(version, os.path.getmtime(manifest))
+        app.extensions['template_version'] = version
+    return version
+
+
+def conditional(validator):
+    # validator(**view_args) returns the state the page is rendered from, or
+    # None when the page should simply be rendered (e.g. the entity does not
+    # exist)
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            render = current_app.ensure_sync(view)
+            if not page_is_cacheable():
+                # a pending flash message must be rendered, not revalidated
+                return render(*args, **kwargs)
+            state = validator(**kwargs)
+            if state is None:
+                return render(*args, **kwargs)
+            etag = hashlib.sha1(repr((_template_version(current_app), state)).encode()).hexdigest()
+            g.page_version = etag
+            if is_resource_modified(request.environ, etag=etag):
+                response = make_response(render(*args, **kwargs))
+            else:
+                response = current_app.response_class(status=304)
+            response.set_etag(etag, weak=True)
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
+
+
+def page_version():
+    # the ETag of the page being rendered, for the page cache
+    return g.get('page_version')
+
+
+def listing_of(*models):
+    def validator(**kwargs):
+        return tuple(db.session.execute(queries.table_version(*models)).one())
+    return validator
+
+
+def _detail(statement):
+    row = db.session.execute(statement).first()
+    return tuple(row) if row is not None else None
+
+
+def _feed(statement):
+    # a calendar feed does not change when a show starts, only when its
+    # window moves on to the next day
+    row = db.session.execute(statement).first()
+    if row is None:
+        return None
+    own, shows, others, count, _, _ = row
+    return own, shows, others, count, date.today()
+
+
+def venue_detail(venue_id):
+    return _detail(queries.venue_version(venue_id, datetime.now()))
+
+
+def artist_detail(artist_id):
+    return _detail(queries.artist_version(artist_id, datetime.now()))
+
+
+def venue_feed(venue_id):
+    return _feed(queries.venue_version(venue_id, datetime.now()))
+
+
+def artist_feed(artist_id):
+    return _feed(queries.artist_version(artist_id, datetime.now()))
+
+
+venue_listing = listing_of(Venue)
+artist_listing = listing_of(Artist)
+show_listing = listing_of(Show, Venue, Artist)
+
+
+def show_calendar():
+    # the range API's default window starts today
+    return show_listing() + (date.today(),)
@@ -0,0 +1,133 @@
+from datetime import datetime
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import bindparam
+
+from models import Artist, Show, Venue, db
+
+# Denormalized upcoming/past show counters on Venue and Artist.
+#
+# Every show carries is_past, which says which of the two counters it is
+# currently counted in. Writers adjust the counters in the same transaction
+# as the show rows; `flask counters roll-forward` moves shows whose start
+# time has passed from upcoming to past, and `flask counters reconcile`
+# recomputes everything from the show table to repair drift. Nothing in the
+# app runs them: both are scheduled from cron (see the README).
+
+PARENTS = ((Venue, Show.venue_id), (Artist, Show.artist_id))
+
+
+def apply_show_deltas(shows, sign=1):
+    # shows: iterable of (venue_id, artist_id, is_past) that were added
+    # (sign=1) or removed (sign=-1) in the current transaction.
+    deltas = {Venue: {}, Artist: {}}
+    for venue_id, artist_id, is_past in shows:
+        for model, entity_id in ((Venue, venue_id), (Artist, artist_id)):
+            upcoming, past = deltas[model].get(entity_id, (0, 0))
+            if is_past:
+                past += sign
+            else:
+                upcoming += sign
+            deltas[model][entity_id] = (upcoming, past)
+
+    for model, by_id in deltas.items():
+        if not by_id:
+            continue
+        table = model.__table__
+        db.session.execute(
+            table.update().where(table.c.id == bindparam('entity_id')).values(
+                upcoming_shows_count=table.c.upcoming_shows_count + bindparam('upcoming'),
+                past_shows_count=table.c.past_shows_count + bindparam('past')),
+            [{'entity_id': entity_id, 'upcoming': upcoming, 'past': past}
+             for entity_id, (upcoming, past) in by_id.items()])
+
+
+def _count(fk, model, *criteria):
+    return db.session.query(db.func.count(Show.id)).filter(
+        fk == model.id, *criteria).scalar_subquery()
+
+
+def _decrement(parents, *criteria):
+    for model, fk in parents:
+        db.session.query(model).filter(
+            model.id.in_(db.session.query(fk).filter(*criteria))
+        ).update({
+            model.upcoming_shows_count: model.upcoming_shows_count - _count(fk, model, ~Show.is_past, *criteria),
+            model.past_shows_count: model.past_shows_count - _count(fk, model, Show.is_past, *criteria),
+        }, synchronize_session=False)
+
+
+def remove_shows(*criteria):
+    # Decrement the counters of every venue and artist touched by the shows
+    # matching criteria, then delete those shows, as set-based statements.
+    _decrement(PARENTS, *criteria)
+    return db.session.query(Show).filter(*criteria).delete(synchronize_session=False)
+
+
+def detach_shows(model, ids):
+    # Called before deleting the venues or artists in ids, whose shows go
+    # with them through ON DELETE CASCADE: takes those shows out of the
+    # counters on the other side. Returns the cache keys of the other side.
+    fk = dict((parent, fk) for parent, fk in PARENTS)[model]
+    others = [(parent, other_fk) for parent, other_fk in PARENTS if parent is not model]
+    _decrement(others, fk.in_(ids))
+    return {f'{parent.__tablename__.lower()}:{entity_id}'
+            for parent, other_fk in others
+            for (entity_id,) in db.session.query(other_fk).filter(fk.in_(ids)).distinct()}
+
+
+def roll_forward(now=None):
+    # Returns the cache keys of the venues and artists whose counters moved.
+    now = now or datetime.now()
+    due = db.session.query(Show.id, Show.venue_id, Show.artist_id).filter(
+        ~Show.is_past, Show.start_time <= now).with_for_update(skip_locked=True).all()
+    if not due:
+        db.session.rollback()
+        return set()
+    ids = [show_id for show_id, _, _ in due]
+    apply_show_deltas(((venue_id, artist_id, False) for _, venue_id, artist_id in due), sign=-1)
+    apply_show_deltas(((venue_id, artist_id, True) for _, venue_id, artist_id in due))
+    db.session.query(Show).filter(Show.id.in_(ids)).update(
+        {Show.is_past: True}, synchronize_session=False)
+    db.session.commit()
+    return ({f'venue:{venue_id}' for _, venue_id, _ in due}
+            | {f'artist:{artist_id}' for _, _, artist_id in due})
+
+
+def reconcile(now=None):
+    # Returns the number of shows and entities that had drifted.
+    now = now or datetime.now()
+    repaired = db.session.query(Show).filter(
+        Show.is_past != (Show.start_time <= now)
+    ).update({Show.is_past: Show.start_time <= now}, synchronize_session=False)
+    for model, fk in PARENTS:
+        upcoming = _count(fk, model, ~Show.is_past)
+        past = _count(fk, model, Show.is_past)
+        repaired += db.session.query(model).filter(db.or_(
+            model.upcoming_shows_count != upcoming,
+            model.past_shows_count != past,
+        )).update({
+            model.upcoming_shows_count: upcoming,
+            model.past_shows_count: past,
+        }, synchronize_session=False)
+    db.session.commit()
+    return repaired
+
+
+counters_cli = AppGroup('counters', help='Maintain the upcoming/past show counters.')
+
+
+@counters_cli.command('roll-forward')
+def roll_forward_command():
+    """Move shows that have started from upcoming to past."""
+    keys = roll_forward()
+    current_app.extensions['page_cache'].invalidate(*keys)
+    click.echo(f'{len(keys)} venue/artist counters rolled forward')
+
+
+@counters_cli.command('reconcile')
+def reconcile_command():
+    """Recompute every counter from the show table."""
+    click.echo(f'{reconcile()} rows repaired')
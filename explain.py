@@ -0,0 +1,72 @@
+from datetime import datetime
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import select, text
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+from models import Artist, Show, Venue, db
+import queries
+
+# Query plans of the venue and artist pages.
+#
+# The show tiles of a detail page are read through the (venue_id,
+# start_time) / (artist_id, start_time) indexes. Each statement is run under
+# EXPLAIN (EXPLAIN QUERY PLAN on SQLite) and the plan has to name its index,
+# so a change to entity_shows() or to the indexes that turns the page back
+# into a scan of show fails the build. On PostgreSQL sequential scans are
+# disabled for the check: on a small table the planner rightly prefers them,
+# and the question is whether the index can serve the query, not whether it
+# pays off at this size. The repo has no test suite, so this command is
+# that regression check; run it after changing the queries or indexes.
+
+CHECKS = [
+    ('venue upcoming', Show.venue_id, Venue, True, 'ix_show_venue_id_start_time'),
+    ('venue past', Show.venue_id, Venue, False, 'ix_show_venue_id_start_time'),
+    ('artist upcoming', Show.artist_id, Artist, True, 'ix_show_artist_id_start_time'),
+    ('artist past', Show.artist_id, Artist, False, 'ix_show_artist_id_start_time'),
+]
+
+
+class Explain(Executable, ClauseElement):
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(Explain)
+def _compile_explain(element, compiler, **kw):
+    prefix = 'EXPLAIN QUERY PLAN' if compiler.dialect.name == 'sqlite' else 'EXPLAIN'
+    return f'{prefix} {compiler.process(element.statement, **kw)}'
+
+
+def plan(statement):
+    # the plan as text, one line per node
+    rows = db.session.execute(Explain(statement)).all()
+    # SQLite returns (id, parent, notused, detail), PostgreSQL one column
+    return '\n'.join(str(row[-1]) for row in rows)
+
+
+@click.command('explain')
+@with_appcontext
+def explain_command():
+    """Check that the detail page queries use the show indexes."""
+    now = datetime.now()
+    failed = []
+    try:
+        if db.engine.dialect.name == 'postgresql':
+            db.session.execute(text('SET LOCAL enable_seqscan = off'))
+        for label, fk, model, upcoming, index in CHECKS:
+            entity_id = db.session.execute(select(model.id).limit(1)).scalar() or 1
+            text_plan = plan(queries.entity_shows(fk, entity_id, now, upcoming))
+            ok = index in text_plan
+            click.echo(f'{label}: {"ok" if ok else "MISSING " + index}')
+            click.echo('\n'.join('    ' + line for line in text_plan.splitlines()))
+            if not ok:
+                failed.append(label)
+    finally:
+        db.session.rollback()
+    if failed:
+        raise click.ClickException(f'Not served by their index: {", ".join(failed)}.')
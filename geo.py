@@ -0,0 +1,345 @@
+import bisect
+import csv
+import heapq
+import math
+import os
+import random
+import time
+from collections import namedtuple
+from functools import lru_cache
+
+import click
+from flask import abort, current_app, request
+from flask.cli import AppGroup, with_appcontext
+from sqlalchemy import func, select
+
+from background_index import BackgroundIndex
+from models import Venue, db
+
+# Venues near a point.
+#
+# Venue coordinates come from the bundled city-centroid table in
+# data/us_city_centroids.csv, looked up by (city, state) whenever a venue is
+# written. Each worker keeps every located venue in a GridIndex of
+# fixed-size lat/lng cells; a k-nearest query starts from the query's cell
+# and only looks at the cells that can still beat the k-th best distance.
+# Until the index is built (in a background thread, on first use and again
+# every GEO_INDEX_TTL seconds so writes made by other workers show up, see
+# background_index.py) queries are answered from a bounding-box SQL query
+# over ix_venue_lat_lng.
+
+CENTROIDS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'us_city_centroids.csv')
+EARTH_RADIUS_MILES = 3958.8
+MILES_PER_DEGREE = EARTH_RADIUS_MILES * math.pi / 180
+CELL_DEGREES = 0.01
+
+NEARBY_K = 10
+MAX_NEARBY_K = 100
+NEARBY_MILES = 30.0
+MAX_NEARBY_MILES = 500.0
+
+NearbyVenue = namedtuple('NearbyVenue', ['id', 'name', 'city', 'state', 'distance_miles'])
+
+
+@lru_cache(maxsize=None)
+def centroids():
+    with open(CENTROIDS, newline='') as f:
+        return {(row['city'].lower(), row['state']): (float(row['latitude']), float(row['longitude']))
+                for row in csv.DictReader(f)}
+
+
+def locate(city, state):
+    if not city or not state:
+        return None
+    return centroids().get((city.strip().lower(), state.strip().upper()))
+
+
+def coordinates(city, state):
+    # column values for a venue in (city, state); None for unknown cities
+    point = locate(city, state)
+    latitude, longitude = point if point else (None, None)
+    return {'latitude': latitude, 'longitude': longitude}
+
+
+def distance_miles(lat1, lng1, lat2, lng2):
+    # haversine
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    h = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_MILES * math.asin(min(1.0, math.sqrt(h)))
+
+
+class GridIndex:
+    # Occupied cells are also kept as a sorted list of rows, each with its
+    # sorted occupied columns, so a query only visits cells that hold venues
+    # and can still beat the current k-th best distance, however sparse the
+    # surrounding grid is. Candidates are ranked on the equirectangular
+    # distance around the query point, within a fraction of a percent of the
+    # great-circle distance at these radii; the distances returned are
+    # haversine.
+
+    def __init__(self, cell_degrees=CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        self._cells = {}
+        self._rows = {}
+        self._row_keys = []
+        self._venues = {}
+
+    def _cell(self, lat, lng):
+        return math.floor(lat / self.cell_degrees), math.floor(lng / self.cell_degrees)
+
+    def add(self, venue_id, lat, lng, name=None, city=None, state=None):
+        self.remove(venue_id)
+        if lat is None or lng is None:
+            return
+        self._venues[venue_id] = (lat, lng, name, city, state)
+        key = self._cell(lat, lng)
+        cell = self._cells.get(key)
+        if cell is None:
+            cell = self._cells[key] = []
+            row, col = key
+            cols = self._rows.get(row)
+            if cols is None:
+                cols = self._rows[row] = []
+                bisect.insort(self._row_keys, row)
+            bisect.insort(cols, col)
+        cell.append((lat, lng, venue_id))
+
+    def remove(self, venue_id):
+        venue = self._venues.pop(venue_id, None)
+        if venue is None:
+            return
+        key = self._cell(venue[0], venue[1])
+        cell = self._cells[key]
+        cell.remove((venue[0], venue[1], venue_id))
+        if not cell:
+            del self._cells[key]
+            row, col = key
+            cols = self._rows[row]
+            del cols[bisect.bisect_left(cols, col)]
+            if not cols:
+                del self._rows[row]
+                del self._row_keys[bisect.bisect_left(self._row_keys, row)]
+
+    def __len__(self):
+        return len(self._venues)
+
+    def nearest(self, lat, lng, k=NEARBY_K, miles=NEARBY_MILES):
+        row, col = self._cell(lat, lng)
+        size = self.cell_degrees
+        scale = max(math.cos(math.radians(lat)), 1e-6)
+        limit = (miles / MILES_PER_DEGREE) ** 2  # squared degrees
+        best = []  # max-heap of (-squared degrees, id), at most k long
+
+        def consider(points):
+            nonlocal limit
+            for vlat, vlng, venue_id in points:
+                dy = vlat - lat
+                dx = (vlng - lng) * scale
+                d2 = dx * dx + dy * dy
+                if d2 > limit:
+                    continue
+                if len(best) < k:
+                    heapq.heappush(best, (-d2, venue_id))
+                    if len(best) == k:
+                        limit = -best[0][0]
+                else:
+                    heapq.heapreplace(best, (-d2, venue_id))
+                    limit = -best[0][0]
+
+        # the query's cell and its neighbours first, to tighten the limit
+        for r in (row - 1, row, row + 1):
+            for c in (col - 1, col, col + 1):
+                consider(self._cells.get((r, c), ()))
+
+        # then the other occupied cells, rows nearest first; a cell dr rows
+        # and dc columns away is at least dr - 1 and dc - 1 whole cells off
+        reach = int(math.sqrt(limit) / size) + 1
+        first = bisect.bisect_left(self._row_keys, row - reach)
+        last = bisect.bisect_right(self._row_keys, row + reach)
+        for r in sorted(self._row_keys[first:last], key=lambda r: abs(r - row)):
+            dr = abs(r - row)
+            row_floor = (max(dr - 1, 0) * size) ** 2
+            if row_floor > limit:
+                break
+            span = int(math.sqrt(limit - row_floor) / (size * scale)) + 1
+            cols = self._rows[r]
+            for c in cols[bisect.bisect_left(cols, col - span):bisect.bisect_right(cols, col + span)]:
+                dc = abs(c - col)
+                if dr <= 1 and dc <= 1:
+                    continue
+                if row_floor + (max(dc - 1, 0) * size * scale) ** 2 > limit:
+                    continue
+                consider(self._cells[(r, c)])
+
+        results = []
+        for _, venue_id in best:
+            vlat, vlng, name, city, state = self._venues[venue_id]
+            results.append(NearbyVenue(venue_id, name, city, state,
+                                       round(distance_miles(lat, lng, vlat, vlng), 2)))
+        results.sort(key=lambda venue: (venue.distance_miles, venue.id))
+        return results
+
+
+def bounding_box(lat, lng, miles):
+    dlat = miles / MILES_PER_DEGREE
+    dlng = miles / (MILES_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6))
+    return lat - dlat, lat + dlat, lng - dlng, lng + dlng
+
+
+def nearby_statement(lat, lng, miles):
+    south, north, west, east = bounding_box(lat, lng, miles)
+    return select(Venue.id, Venue.name, Venue.city, Venue.state, Venue.latitude, Venue.longitude).where(
+        Venue.latitude.between(south, north), Venue.longitude.between(west, east))
+
+
+def _nearby_sql(lat, lng, k, miles):
+    venues = []
+    for row in db.session.execute(nearby_statement(lat, lng, miles)):
+        distance = distance_miles(lat, lng, row.latitude, row.longitude)
+        if distance <= miles:
+            venues.append(NearbyVenue(row.id, row.name, row.city, row.state, round(distance, 2)))
+    venues.sort(key=lambda venue: (venue.distance_miles, venue.id))
+    return venues[:k]
+
+
+def build_index(cell_degrees=CELL_DEGREES):
+    index = GridIndex(cell_degrees)
+    rows = db.session.execute(select(
+        Venue.id, Venue.latitude, Venue.longitude, Venue.name, Venue.city, Venue.state
+    ).where(Venue.latitude.isnot(None), Venue.longitude.isnot(None)))
+    for row in rows:
+        index.add(*row)
+    return index
+
+
+_index = BackgroundIndex(
+    'geo-index', lambda: build_index(current_app.config.get('GEO_CELL_DEGREES', CELL_DEGREES)),
+    'GEO_INDEX_TTL')
+
+
+def current_index():
+    # the worker's index, or None while the first build is running
+    if not current_app.config.get('GEO_INDEX', True):
+        return None
+    return _index.current()
+
+
+def update(venue):
+    # keeps this worker's index current after a venue write
+    _index.apply(lambda index: index.add(
+        venue.id, venue.latitude, venue.longitude, venue.name, venue.city, venue.state))
+
+
+def discard(*venue_ids):
+    def remove(index):
+        for venue_id in venue_ids:
+            index.remove(venue_id)
+    _index.apply(remove)
+
+
+def invalidate():
+    _index.invalidate()
+
+
+def nearby(lat, lng, k=NEARBY_K, miles=NEARBY_MILES):
+    index = current_index()
+    if index is None:
+        return _nearby_sql(lat, lng, k, miles)
+    return index.nearest(lat, lng, k, miles)
+
+
+def requested_point():
+    # (lat, lng) from ?lat=&lng= or from the centroid of ?city=&state=
+    lat = request.args.get('lat', type=float)
+    lng = request.args.get('lng', type=float)
+    if lat is None and lng is None and request.args.get('city'):
+        point = locate(request.args['city'], request.args.get('state'))
+        if point is None:
+            abort(400, description='Unknown city')
+        return point
+    if lat is None or lng is None or not -90 <= lat <= 90 or not -180 <= lng <= 180:
+        abort(400, description='lat and lng, or city and state, are required')
+    return lat, lng
+
+
+def requested_limits():
+    k = request.args.get('k', NEARBY_K, type=int)
+    miles = request.args.get('miles', NEARBY_MILES, type=float)
+    return max(1, min(k, MAX_NEARBY_K)), max(0.0, min(miles, MAX_NEARBY_MILES))
+
+
+geo_cli = AppGroup('geo', help='Venue coordinates and the nearby-venues index.')
+
+
+@geo_cli.command('backfill')
+@with_appcontext
+def backfill_command():
+    """Fill missing venue coordinates from the city centroids."""
+    updated = 0
+    for (city, state), (latitude, longitude) in centroids().items():
+        result = db.session.execute(Venue.__table__.update().where(
+            func.lower(Venue.city) == city, Venue.state == state,
+            Venue.latitude.is_(None)).values(latitude=latitude, longitude=longitude))
+        updated += result.rowcount
+    db.session.commit()
+    invalidate()
+    click.echo(f'{updated} venues located')
+
+
+@geo_cli.command('bench')
+@click.option('--venues', 'count', default=100000, show_default=True,
+              help='Synthetic venues in the index.')
+@click.option('--queries', default=2000, show_default=True)
+@click.option('-k', default=NEARBY_K, show_default=True)
+@click.option('--miles', default=NEARBY_MILES, show_default=True)
+@click.option('--cell-degrees', type=float, help='Grid cell size (default: GEO_CELL_DEGREES).')
+@click.option('--sql', 'with_sql', is_flag=True,
+              help='Also time the bounding-box query against the configured database.')
+@click.option('--seed', 'random_seed', default=42, show_default=True)
+@with_appcontext
+def bench_command(count, queries, k, miles, cell_degrees, with_sql, random_seed):
+    """Time k-nearest queries on the grid index against a linear scan."""
+    from bench import percentile
+    from seed import generate_venues
+
+    rng = random.Random(random_seed)
+    cell_degrees = cell_degrees or current_app.config.get('GEO_CELL_DEGREES', CELL_DEGREES)
+    venues = [(i, v['latitude'], v['longitude'], v['name'], v['city'], v['state'])
+              for i, v in enumerate(generate_venues(rng, count), 1)]
+    started = time.perf_counter()
+    index = GridIndex(cell_degrees)
+    for venue in venues:
+        index.add(*venue)
+    click.echo(f'index of {len(index)} venues built in {(time.perf_counter() - started) * 1000:.0f}ms')
+
+    points = [(lat + rng.gauss(0, 0.05), lng + rng.gauss(0, 0.05))
+              for _, lat, lng, _, _, _ in rng.sample(venues, queries)]
+    grid_us, scan_us, mismatches = [], [], 0
+    for n, (lat, lng) in enumerate(points):
+        started = time.perf_counter()
+        found = index.nearest(lat, lng, k, miles)
+        grid_us.append((time.perf_counter() - started) * 1e6)
+        if n < 200:
+            started = time.perf_counter()
+            scanned = heapq.nsmallest(k, (
+                (distance_miles(lat, lng, vlat, vlng), i) for i, vlat, vlng, _, _, _ in venues))
+            scan_us.append((time.perf_counter() - started) * 1e6)
+            expected = {i for d, i in scanned if d <= miles}
+            mismatches += len(expected ^ {venue.id for venue in found}) > 0
+    rows = [('grid index', grid_us), ('linear scan', scan_us)]
+
+    if with_sql:
+        sql_us = []
+        for lat, lng in points[:200]:
+            started = time.perf_counter()
+            _nearby_sql(lat, lng, k, miles)
+            sql_us.append((time.perf_counter() - started) * 1e6)
+        rows.append(('bounding-box SQL', sql_us))
+
+    click.echo(f'{"":<20}{"p50 us":>10}{"p99 us":>10}{"max us":>10}')
+    for label, timings in rows:
+        timings.sort()
+        click.echo(f'{label:<20}{percentile(timings, 0.5):>10.0f}{percentile(timings, 0.99):>10.0f}'
+                   f'{timings[-1]:>10.0f}')
+    click.echo(f'{mismatches} of {len(scan_us)} checked queries differ from the linear scan')
@@ -0,0 +1,19 @@
+import multiprocessing
+import os
+
+# The app is built once in the master and forked into the workers, so they
+# share its imported modules and compiled templates instead of each paying
+# for them on boot.
+preload_app = True
+bind = os.environ.get('FYYUR_BIND', '127.0.0.1:8000')
+workers = int(os.environ.get('FYYUR_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+
+
+def post_fork(server, worker):
+    # a connection opened while preloading must not be shared across workers
+    from models import db
+    app = worker.app.wsgi()
+    with app.app_context():
+        db.engine.dispose()
+        for bind in app.config.get('SQLALCHEMY_BINDS') or ():
+            db.get_engine(app, bind=bind).dispose()
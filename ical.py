@@ -0,0 +1,89 @@
+from datetime import date, datetime, time, timedelta, timezone
+
+from flask import Response, stream_with_context
+
+from models import db
+
+# iCalendar (RFC 5545) feeds of a venue's or an artist's shows.
+#
+# Rows come off a server-side cursor FEED_BATCH_SIZE at a time and each
+# VEVENT is written out as it is read, so a feed's memory use does not grow
+# with its length. A feed covers the shows from CALENDAR_PAST_DAYS days ago
+# on; the window moves once a day, which is what the feed validators in
+# conditional.py key on.
+
+PRODID = '-//Fyyur//Shows//EN'
+CALENDAR_PAST_DAYS = 30
+FEED_BATCH_SIZE = 500
+
+
+def feed_start():
+    return datetime.combine(date.today() - timedelta(days=CALENDAR_PAST_DAYS), time.min)
+
+
+def escape(text):
+    return (text or '').replace('\\', '\\\\').replace(';', '\\;').replace(
+        ',', '\\,').replace('\r\n', '\\n').replace('\n', '\\n')
+
+
+def fold(line):
+    # content lines longer than 75 octets continue on lines starting with a
+    # space, without splitting a UTF-8 sequence
+    encoded = line.encode()
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    parts = []
+    start, limit = 0, 75
+    while start < len(encoded):
+        end = min(start + limit, len(encoded))
+        while end < len(encoded) and (encoded[end] & 0xC0) == 0x80:
+            end -= 1
+        parts.append(encoded[start:end].decode())
+        start, limit = end, 74
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def _utc(value, local=True):
+    # start times are naive local time, updated_at is naive UTC
+    if local:
+        value = value.astimezone(timezone.utc)
+    return value.strftime('%Y%m%dT%H%M%SZ')
+
+
+def event(row):
+    end = row.start_time + timedelta(minutes=row.duration_minutes)
+    location = ', '.join(part for part in (row.address, row.city, row.state) if part)
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:show-{row.id}@fyyur',
+        f'DTSTAMP:{_utc(row.updated_at, local=False)}',
+        f'DTSTART:{_utc(row.start_time)}',
+        f'DTEND:{_utc(end)}',
+        f'SUMMARY:{escape(row.artist_name)} at {escape(row.venue_name)}',
+        f'LOCATION:{escape(location)}',
+    ]
+    if row.latitude is not None and row.longitude is not None:
+        lines.append(f'GEO:{row.latitude:.6f};{row.longitude:.6f}')
+    lines.append('END:VEVENT')
+    return ''.join(fold(line) for line in lines)
+
+
+def calendar_response(name, filename, statement):
+    def generate():
+        yield ''.join(fold(line) for line in (
+            'BEGIN:VCALENDAR', 'VERSION:2.0', f'PRODID:{PRODID}', 'CALSCALE:GREGORIAN',
+            'METHOD:PUBLISH', f'X-WR-CALNAME:{escape(name)}'))
+        rows = db.session.execute(
+            statement.execution_options(stream_results=True)).yield_per(FEED_BATCH_SIZE)
+        chunk = []
+        for row in rows:
+            chunk.append(event(row))
+            if len(chunk) >= FEED_BATCH_SIZE:
+                yield ''.join(chunk)
+                chunk = []
+        chunk.append(fold('END:VCALENDAR'))
+        yield ''.join(chunk)
+
+    response = Response(stream_with_context(generate()), mimetype='text/calendar')
+    response.headers['Content-Disposition'] = f'inline; filename="{filename}"'
+    return response
@@ -0,0 +1,250 @@
+import csv
+import json
+import os
+import time
+from datetime import datetime
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from werkzeug.datastructures import MultiDict
+
+from forms import ArtistForm, ShowForm, VenueForm
+from counters import apply_show_deltas
+from models import Artist, Show, Venue, db, DEFAULT_SHOW_MINUTES
+from booking import ScheduleChecker
+import autocomplete
+import geo
+import search
+
+# Streaming bulk import of venues, artists and shows from CSV or JSONL.
+#
+# Rows are validated with the same WTForms classes the create pages use and
+# inserted a batch at a time through a single executemany per batch (which
+# psycopg2 turns into multi-row INSERT ... VALUES pages). Rejected rows go to
+# a side file as JSON lines with their validation errors.
+
+KINDS = {
+    'venues': (Venue, VenueForm),
+    'artists': (Artist, ArtistForm),
+    'shows': (Show, ShowForm),
+}
+
+BOOLEAN_FIELDS = ('seeking_talent', 'seeking_venue')
+FALSE_VALUES = ('', '0', 'false', 'f', 'no', 'n')
+
+
+def read_rows(path):
+    # yields (line number, row, parse errors or None) without loading the
+    # file into memory; a JSONL line that is not a JSON object comes back
+    # as its text with errors, to be rejected like any other bad row
+    with open(path, newline='') as f:
+        if path.endswith('.csv'):
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row, None
+        else:
+            for lineno, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as e:
+                    yield lineno, line, {'row': [f'Invalid JSON: {e}']}
+                    continue
+                if isinstance(row, dict):
+                    yield lineno, row, None
+                else:
+                    yield lineno, row, {'row': ['Expected a JSON object']}
+
+
+def _formdata(row):
+    data = MultiDict()
+    for key, value in row.items():
+        if value is None:
+            continue
+        if key == 'genres':
+            if isinstance(value, str):
+                value = [g.strip() for g in value.split(';') if g.strip()]
+            for genre in value:
+                data.add(key, genre)
+        elif key in BOOLEAN_FIELDS:
+            if str(value).strip().lower() not in FALSE_VALUES:
+                data.add(key, 'y')
+        else:
+            data.add(key, str(value))
+    return data
+
+
+def validate_row(form_class, row):
+    form = form_class(formdata=_formdata(row), meta={'csrf': False})
+    if not form.validate():
+        return None, form.errors
+    return form.data, None
+
+
+def known_references(values):
+    # one IN query per referenced table for the whole batch
+    artist_ids = {v['artist_id'] for v in values}
+    venue_ids = {v['venue_id'] for v in values}
+    known_artists = {i for (i,) in db.session.query(Artist.id).filter(Artist.id.in_(artist_ids))}
+    known_venues = {i for (i,) in db.session.query(Venue.id).filter(Venue.id.in_(venue_ids))}
+    return known_artists, known_venues
+
+
+def prepare_show(values, now):
+    # ShowForm data to show column values in place; form-style errors if the
+    # ids are not integers
+    errors = {}
+    for field in ('artist_id', 'venue_id'):
+        try:
+            values[field] = int(values[field])
+        except (TypeError, ValueError):
+            errors[field] = ['Must be an integer']
+    if errors:
+        return errors
+    values['is_past'] = values['start_time'] <= now
+    values['duration_minutes'] = values['duration_minutes'] or DEFAULT_SHOW_MINUTES
+    return None
+
+
+class Importer:
+    def __init__(self, kind, rejects, batch_size=1000):
+        self.model, self.form_class = KINDS[kind]
+        self.rejects = rejects
+        self.batch_size = batch_size
+        self.inserted = 0
+        self.rejected = 0
+        self.touched = set()
+
+    def reject(self, lineno, row, errors):
+        self.rejected += 1
+        self.rejects.write(json.dumps(
+            {'line': lineno, 'row': row, 'errors': errors}, default=str) + '\n')
+
+    def flush(self, batch):
+        if not batch:
+            return
+        if self.model is Show:
+            batch = self._check_references(batch)
+            batch = self._check_bookings(batch)
+            if not batch:
+                return
+        table = self.model.__table__
+        try:
+            db.session.execute(table.insert(), [values for _, _, values in batch])
+            self._count_shows([values for _, _, values in batch])
+            db.session.commit()
+            self.inserted += len(batch)
+        except Exception:
+            # isolate the offending rows so one bad row does not cost the batch
+            db.session.rollback()
+            for lineno, row, values in batch:
+                try:
+                    db.session.execute(table.insert(), values)
+                    self._count_shows([values])
+                    db.session.commit()
+                    self.inserted += 1
+                except Exception as e:
+                    db.session.rollback()
+                    self.reject(lineno, row, {'database': [str(e.__cause__ or e)]})
+                    continue
+        if self.model is Show:
+            for _, _, values in batch:
+                self.touched.add(f'venue:{values["venue_id"]}')
+                self.touched.add(f'artist:{values["artist_id"]}')
+
+    def _count_shows(self, shows):
+        if self.model is Show:
+            apply_show_deltas((v['venue_id'], v['artist_id'], v['is_past']) for v in shows)
+
+    def _check_references(self, batch):
+        known_artists, known_venues = known_references([v for _, _, v in batch])
+        valid = []
+        for lineno, row, values in batch:
+            errors = {}
+            if values['artist_id'] not in known_artists:
+                errors['artist_id'] = ['Unknown artist']
+            if values['venue_id'] not in known_venues:
+                errors['venue_id'] = ['Unknown venue']
+            if errors:
+                self.reject(lineno, row, errors)
+            else:
+                valid.append((lineno, row, values))
+        return valid
+
+    def _check_bookings(self, batch):
+        # against the stored schedule and against earlier rows of the batch
+        checker = ScheduleChecker.load(values for _, _, values in batch)
+        valid = []
+        for lineno, row, values in batch:
+            errors = checker.check(values['venue_id'], values['artist_id'],
+                                   values['start_time'], values['duration_minutes'])
+            if errors:
+                self.reject(lineno, row, errors)
+            else:
+                valid.append((lineno, row, values))
+        return valid
+
+    def run(self, rows, progress=None):
+        batch = []
+        for lineno, row, errors in rows:
+            if errors:
+                self.reject(lineno, row, errors)
+                continue
+            values, errors = validate_row(self.form_class, row)
+            if errors:
+                self.reject(lineno, row, errors)
+                continue
+            if self.model is Show:
+                errors = prepare_show(values, datetime.now())
+                if errors:
+                    self.reject(lineno, row, errors)
+                    continue
+            elif self.model is Venue:
+                values.update(geo.coordinates(values['city'], values['state']))
+            batch.append((lineno, row, values))
+            if len(batch) >= self.batch_size:
+                self.flush(batch)
+                batch = []
+                if progress:
+                    progress(self)
+        self.flush(batch)
+
+
+@click.command('import')
+@click.argument('kind', type=click.Choice(sorted(KINDS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=1000, show_default=True,
+              help='Rows inserted per transaction.')
+@click.option('--rejects', 'rejects_path', type=click.Path(dir_okay=False),
+              help='Where rejected rows are written (default: PATH.rejects.jsonl).')
+@with_appcontext
+def import_command(kind, path, batch_size, rejects_path):
+    """Bulk import venues, artists or shows from a CSV or JSONL file."""
+    rejects_path = rejects_path or os.path.splitext(path)[0] + '.rejects.jsonl'
+    started = time.perf_counter()
+
+    def progress(importer):
+        elapsed = time.perf_counter() - started
+        click.echo(f'{importer.inserted} inserted, {importer.rejected} rejected '
+                   f'({importer.inserted / elapsed:.0f} rows/s)', err=True)
+
+    with open(rejects_path, 'w') as rejects:
+        importer = Importer(kind, rejects, batch_size)
+        importer.run(read_rows(path), progress)
+
+    if importer.model is Show:
+        current_app.extensions['page_cache'].invalidate(*importer.touched)
+    else:
+        search.invalidate(importer.model)
+        autocomplete.invalidate()
+        current_app.extensions['recent_listings'].invalidate()
+        if importer.model is Venue:
+            geo.invalidate()
+
+    elapsed = time.perf_counter() - started
+    click.echo(f'Imported {importer.inserted} {kind} in {elapsed:.1f}s '
+               f'({importer.inserted / elapsed:.0f} rows/s); '
+               f'{importer.rejected} rejected -> {rejects_path}')
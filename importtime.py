@@ -0,0 +1,64 @@
+import re
+import statistics
+import subprocess
+import sys
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+# Import cost of the WSGI entry point, as a prefork server pays it.
+#
+# Each run imports `wsgi` in a fresh interpreter under `python -X importtime`
+# and reads the per-module timings it writes to stderr. The total is the
+# cumulative time of the top-level `wsgi` import; the median over the runs is
+# checked against IMPORT_TIME_BUDGET_MS so a change that drags a heavy module
+# back into the import path fails the build.
+
+LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$')
+
+
+def measure(module='wsgi', cwd=None):
+    # Returns (total us, [(self us, cumulative us, name)]) for the modules
+    # pulled in by one `import module`.
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=cwd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise click.ClickException(f'import {module} failed:\n{result.stderr[-2000:]}')
+    modules = []
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if not match:
+            continue
+        own, cumulative, indent, name = match.groups()
+        if indent:
+            modules.append((int(own), int(cumulative), name))
+        elif name == module:
+            # lines are written children first; everything since the previous
+            # top-level import belongs to this one
+            return int(cumulative), modules
+        else:
+            modules = []
+    raise click.ClickException(f'no importtime output for {module}')
+
+
+@click.command('importtime')
+@click.option('--runs', default=5, show_default=True, help='Fresh interpreters to time.')
+@click.option('--top', default=15, show_default=True, help='Slowest modules to list.')
+@click.option('--budget', type=int, help='Budget in ms (default: IMPORT_TIME_BUDGET_MS).')
+@with_appcontext
+def importtime_command(runs, top, budget):
+    """Time `import wsgi` and fail if it is over budget."""
+    if budget is None:
+        budget = current_app.config.get('IMPORT_TIME_BUDGET_MS')
+    cwd = current_app.root_path
+    results = [measure(cwd=cwd) for _ in range(runs)]
+    total = statistics.median(us for us, _ in results) / 1000
+
+    _, modules = results[-1]
+    click.echo(f'{"module":<40}{"self ms":>9}{"cum ms":>9}')
+    for own, cumulative, name in sorted(modules, reverse=True)[:top]:
+        click.echo(f'{name:<40}{own / 1000:>9.1f}{cumulative / 1000:>9.1f}')
+    click.echo(f'{"import wsgi (median of " + str(runs) + ")":<40}{total:>18.1f}')
+    if budget is not None and total > budget:
+        raise click.ClickException(f'import wsgi took {total:.1f}ms, budget is {budget}ms.')
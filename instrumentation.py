@@ -0,0 +1,129 @@
+import json
+import logging
+import time
+from logging import FileHandler, Formatter
+
+from flask import current_app, g, has_request_context, request
+from jinja2 import Template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Per-request instrumentation: wall time, SQL time and statement count, time
+# spent rendering templates and the slowest statement. Requests slower than
+# SLOW_REQUEST_THRESHOLD_MS are written as JSON lines to SLOW_REQUEST_LOG;
+# with SERVER_TIMING the timings also go out as a Server-Timing header.
+
+
+def _profile():
+    if has_request_context():
+        return g.get('_request_profile')
+    return None
+
+
+class ProfiledTemplate(Template):
+    def render(self, *args, **kwargs):
+        profile = _profile()
+        if profile is None:
+            return super().render(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            profile['template_ms'] += (time.perf_counter() - started) * 1000
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('_query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'handle_error')
+def _handle_error(context):
+    # a failed statement never reaches after_cursor_execute
+    if context.connection is not None and context.execution_context is not None:
+        started = context.connection.info.get('_query_started')
+        if started:
+            started.pop()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = (time.perf_counter() - conn.info['_query_started'].pop()) * 1000
+    profile = _profile()
+    if profile is None:
+        return
+    profile['sql_ms'] += elapsed
+    profile['sql_count'] += 1
+    if profile['slowest_sql'] is None or elapsed > profile['slowest_sql']['ms']:
+        profile['slowest_sql'] = {'ms': round(elapsed, 3), 'statement': statement}
+
+
+class RequestProfiler:
+    def __init__(self, app=None):
+        self.last_record = None
+        self.slow_log = logging.getLogger('fyyur.slow')
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.jinja_env.template_class = ProfiledTemplate
+        app.before_request(self._start)
+        app.after_request(self._finish)
+
+        path = app.config.get('SLOW_REQUEST_LOG')
+        if path and not self.slow_log.handlers:
+            handler = FileHandler(path)
+            handler.setFormatter(Formatter('%(message)s'))
+            self.slow_log.addHandler(handler)
+            self.slow_log.setLevel(logging.INFO)
+            self.slow_log.propagate = False
+        app.extensions['request_profiler'] = self
+
+    def _start(self):
+        if current_app.config.get('PROFILE_REQUESTS'):
+            g._request_profile = {
+                'started': time.perf_counter(),
+                'sql_ms': 0.0,
+                'sql_count': 0,
+                'template_ms': 0.0,
+                'slowest_sql': None,
+            }
+
+    def _finish(self, response):
+        profile = g.get('_request_profile')
+        if profile is None:
+            return response
+        record = {
+            'method': request.method,
+            'route': request.url_rule.rule if request.url_rule else request.path,
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+        }
+        threshold = current_app.config.get('SLOW_REQUEST_THRESHOLD_MS', 500)
+        if response.is_streamed:
+            # the body, and the SQL behind it, is generated after this
+            # returns: the record is completed once the response has been
+            # sent, and no Server-Timing goes out with headers that precede
+            # the work
+            response.call_on_close(lambda: self._record(record, profile, threshold))
+            return response
+        g.pop('_request_profile')
+        self._record(record, profile, threshold)
+        if current_app.config.get('SERVER_TIMING'):
+            response.headers['Server-Timing'] = (
+                f'sql;dur={record["sql_ms"]}, template;dur={record["template_ms"]}, '
+                f'total;dur={record["wall_ms"]}')
+        return response
+
+    def _record(self, record, profile, threshold):
+        wall_ms = (time.perf_counter() - profile['started']) * 1000
+        record.update({
+            'wall_ms': round(wall_ms, 3),
+            'sql_ms': round(profile['sql_ms'], 3),
+            'sql_count': profile['sql_count'],
+            'template_ms': round(profile['template_ms'], 3),
+            'slowest_sql': profile['slowest_sql'],
+        })
+        self.last_record = record
+        if wall_ms >= threshold:
+            self.slow_log.info(json.dumps(record))
@@ -0,0 +1,37 @@
+"""add show duration and booking exclusion constraints
+
+Revision ID: a8c3e5f7b9d2
+Revises: f1a2b3c4d5e6
+Create Date: 2026-10-18 14:31:27.640118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a8c3e5f7b9d2'
+down_revision = 'f1a2b3c4d5e6'
+branch_labels = None
+depends_on = None
+
+SHOW_RANGE = "tsrange(start_time, start_time + duration_minutes * interval '1 minute')"
+
+
+def upgrade():
+    # btree_gist lets the integer equality and the range overlap share one
+    # GiST index. Adding the constraints fails if stored shows already
+    # overlap; those have to be moved or removed first.
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    op.add_column('show', sa.Column('duration_minutes', sa.Integer(), server_default='120', nullable=False))
+    op.create_check_constraint('ck_show_duration_minutes', 'show', 'duration_minutes BETWEEN 1 AND 1440')
+    for key in ('venue', 'artist'):
+        op.execute(f'ALTER TABLE show ADD CONSTRAINT show_{key}_no_overlap '
+                   f'EXCLUDE USING gist ({key}_id WITH =, {SHOW_RANGE} WITH &&)')
+
+
+def downgrade():
+    for key in ('artist', 'venue'):
+        op.drop_constraint(f'show_{key}_no_overlap', 'show')
+    op.drop_constraint('ck_show_duration_minutes', 'show', type_='check')
+    op.drop_column('show', 'duration_minutes')
@@ -0,0 +1,33 @@
+"""add updated_at to venue, artist and show
+
+Revision ID: b6d1f3a5c7e9
+Revises: a8c3e5f7b9d2
+Create Date: 2026-10-18 15:12:53.208741
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6d1f3a5c7e9'
+down_revision = 'a8c3e5f7b9d2'
+branch_labels = None
+depends_on = None
+
+TABLES = (('Venue', 'ix_venue_updated_at'), ('Artist', 'ix_artist_updated_at'), ('show', 'ix_show_updated_at'))
+
+
+def upgrade():
+    # existing rows count as modified now; the application sets the value
+    # (in UTC) on every insert and update from here on
+    for table, index in TABLES:
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), nullable=False,
+                                       server_default=sa.text("(now() at time zone 'utc')")))
+        op.create_index(index, table, ['updated_at'], unique=False)
+
+
+def downgrade():
+    for table, index in reversed(TABLES):
+        op.drop_index(index, table_name=table)
+        op.drop_column(table, 'updated_at')
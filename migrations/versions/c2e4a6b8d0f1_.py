@@ -0,0 +1,29 @@
+"""add latitude and longitude to venue
+
+Revision ID: c2e4a6b8d0f1
+Revises: b6d1f3a5c7e9
+Create Date: 2026-10-18 16:41:08.530217
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2e4a6b8d0f1'
+down_revision = 'b6d1f3a5c7e9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # existing venues are located afterwards with `flask geo backfill`
+    op.add_column('Venue', sa.Column('latitude', sa.Float(), nullable=True))
+    op.add_column('Venue', sa.Column('longitude', sa.Float(), nullable=True))
+    op.create_index('ix_venue_lat_lng', 'Venue', ['latitude', 'longitude'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_venue_lat_lng', table_name='Venue')
+    op.drop_column('Venue', 'longitude')
+    op.drop_column('Venue', 'latitude')
@@ -0,0 +1,41 @@
+"""add trigram search indexes on venue and artist
+
+Revision ID: c7a9e0f1d2b3
+Revises: b3f1c2d4e5a6
+Create Date: 2026-10-18 10:03:17.554102
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7a9e0f1d2b3'
+down_revision = 'b3f1c2d4e5a6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index('ix_venue_name_trgm', 'Venue', ['name'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+    op.create_index('ix_venue_city_trgm', 'Venue', ['city'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'city': 'gin_trgm_ops'})
+    op.create_index('ix_venue_genres', 'Venue', ['genres'], unique=False,
+                    postgresql_using='gin')
+    op.create_index('ix_artist_name_trgm', 'Artist', ['name'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+    op.create_index('ix_artist_city_trgm', 'Artist', ['city'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'city': 'gin_trgm_ops'})
+    op.create_index('ix_artist_genres_trgm', 'Artist', ['genres'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'genres': 'gin_trgm_ops'})
+
+
+def downgrade():
+    op.drop_index('ix_artist_genres_trgm', table_name='Artist')
+    op.drop_index('ix_artist_city_trgm', table_name='Artist')
+    op.drop_index('ix_artist_name_trgm', table_name='Artist')
+    op.drop_index('ix_venue_genres', table_name='Venue')
+    op.drop_index('ix_venue_city_trgm', table_name='Venue')
+    op.drop_index('ix_venue_name_trgm', table_name='Venue')
@@ -0,0 +1,42 @@
+"""add upcoming/past show counters
+
+Revision ID: d4e8f2a6b1c9
+Revises: c7a9e0f1d2b3
+Create Date: 2026-10-18 11:40:05.918263
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4e8f2a6b1c9'
+down_revision = 'c7a9e0f1d2b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('show', sa.Column('is_past', sa.Boolean(), server_default=sa.false(), nullable=False))
+    for table in ('Venue', 'Artist'):
+        op.add_column(table, sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+        op.add_column(table, sa.Column('past_shows_count', sa.Integer(), server_default='0', nullable=False))
+    op.create_index('ix_show_upcoming_start_time', 'show', ['start_time'], unique=False,
+                    postgresql_where=sa.text('NOT is_past'))
+
+    # backfill from the existing shows
+    op.execute('UPDATE show SET is_past = start_time <= LOCALTIMESTAMP')
+    for table, fk in (('Venue', 'venue_id'), ('Artist', 'artist_id')):
+        op.execute(f'''
+            UPDATE "{table}" t SET
+                upcoming_shows_count = (SELECT count(*) FROM show s WHERE s.{fk} = t.id AND NOT s.is_past),
+                past_shows_count = (SELECT count(*) FROM show s WHERE s.{fk} = t.id AND s.is_past)
+        ''')
+
+
+def downgrade():
+    op.drop_index('ix_show_upcoming_start_time', table_name='show')
+    for table in ('Artist', 'Venue'):
+        op.drop_column(table, 'past_shows_count')
+        op.drop_column(table, 'upcoming_shows_count')
+    op.drop_column('show', 'is_past')
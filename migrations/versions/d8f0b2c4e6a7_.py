@@ -0,0 +1,24 @@
+"""index show start_time for calendar range queries
+
+Revision ID: d8f0b2c4e6a7
+Revises: c2e4a6b8d0f1
+Create Date: 2026-10-18 17:20:31.904412
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd8f0b2c4e6a7'
+down_revision = 'c2e4a6b8d0f1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_show_start_time_id', 'show', ['start_time', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_show_start_time_id', table_name='show')
@@ -0,0 +1,47 @@
+"""store artist genres as an indexed array
+
+Revision ID: e5f9a3b7c2d1
+Revises: d4e8f2a6b1c9
+Create Date: 2026-10-18 13:05:42.377120
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5f9a3b7c2d1'
+down_revision = 'd4e8f2a6b1c9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.drop_index('ix_artist_genres_trgm', table_name='Artist')
+    # Existing values are either array literals written by the create form
+    # ('{Jazz,"Hip-Hop"}') or comma separated lists written by the importer
+    # and seed command ('Jazz,Hip-Hop').
+    op.alter_column('Artist', 'genres',
+               existing_type=sa.VARCHAR(length=120),
+               type_=postgresql.ARRAY(sa.String(length=120)),
+               existing_nullable=True,
+               postgresql_using="""
+                   CASE
+                       WHEN genres IS NULL OR btrim(genres) = '' THEN '{}'::varchar[]
+                       WHEN btrim(genres) LIKE '{%' THEN btrim(genres)::varchar[]
+                       ELSE array_remove(regexp_split_to_array(btrim(genres), '\\s*,\\s*'), '')::varchar[]
+                   END""")
+    op.create_index('ix_artist_genres', 'Artist', ['genres'], unique=False,
+                    postgresql_using='gin')
+
+
+def downgrade():
+    op.drop_index('ix_artist_genres', table_name='Artist')
+    op.alter_column('Artist', 'genres',
+               existing_type=postgresql.ARRAY(sa.String(length=120)),
+               type_=sa.VARCHAR(length=120),
+               existing_nullable=True,
+               postgresql_using="array_to_string(genres, ',')")
+    op.create_index('ix_artist_genres_trgm', 'Artist', ['genres'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'genres': 'gin_trgm_ops'})
@@ -0,0 +1,29 @@
+"""cascade show deletes from venue and artist
+
+Revision ID: f1a2b3c4d5e6
+Revises: e5f9a3b7c2d1
+Create Date: 2026-10-18 13:48:10.502916
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1a2b3c4d5e6'
+down_revision = 'e5f9a3b7c2d1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.drop_constraint('show_artist_id_fkey', 'show', type_='foreignkey')
+    op.drop_constraint('show_venue_id_fkey', 'show', type_='foreignkey')
+    op.create_foreign_key('show_artist_id_fkey', 'show', 'Artist', ['artist_id'], ['id'], ondelete='CASCADE')
+    op.create_foreign_key('show_venue_id_fkey', 'show', 'Venue', ['venue_id'], ['id'], ondelete='CASCADE')
+
+
+def downgrade():
+    op.drop_constraint('show_venue_id_fkey', 'show', type_='foreignkey')
+    op.drop_constraint('show_artist_id_fkey', 'show', type_='foreignkey')
+    op.create_foreign_key('show_venue_id_fkey', 'show', 'Venue', ['venue_id'], ['id'])
+    op.create_foreign_key('show_artist_id_fkey', 'show', 'Artist', ['artist_id'], ['id'])
@@ -1,8 +1,16 @@
 from datetime import datetime
-from flask_sqlalchemy import SQLAlchemy
 
+from routing import RoutingSQLAlchemy
 
-db = SQLAlchemy()
+
+db = RoutingSQLAlchemy()
+
+# genre lists are PostgreSQL arrays; SQLite (local runs) stores them as JSON
+GENRES_TYPE = db.ARRAY(db.String(120)).with_variant(db.JSON(), 'sqlite')
+
+# show length bounds; booking conflicts only need to look this far back
+DEFAULT_SHOW_MINUTES = 120
+MAX_SHOW_MINUTES = 24 * 60
 
 class Venue(db.Model):
     __tablename__ = 'Venue'
@@ -15,12 +23,28 @@ class Venue(db.Model):
     phone = db.Column(db.String(120))
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
-    genres = db.Column(db.ARRAY(db.String(120)), nullable=False)
+    genres = db.Column(GENRES_TYPE, nullable=False)
     website_link = db.Column(db.String(120))
     seeking_talent = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(500))
-    shows = db.relationship('Show', backref='Venue', lazy=True)
+    # city centroid from data/us_city_centroids.csv, see geo.py
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # UTC; feeds the ETag / Last-Modified validators in conditional.py
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+    shows = db.relationship('Show', backref='Venue', lazy=True, passive_deletes=True)
 
+    __table_args__ = (
+        db.Index('ix_venue_name_trgm', 'name', postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_venue_city_trgm', 'city', postgresql_using='gin',
+                 postgresql_ops={'city': 'gin_trgm_ops'}),
+        db.Index('ix_venue_genres', 'genres', postgresql_using='gin'),
+        db.Index('ix_venue_updated_at', 'updated_at'),
+        db.Index('ix_venue_lat_lng', 'latitude', 'longitude'),
+    )
 
     # TODO: implement any missing fields, as a database migration using Flask-Migrate
 
@@ -32,23 +56,51 @@ class Artist(db.Model):
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(db.String(120))
+    genres = db.Column(GENRES_TYPE)
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     website_link = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(500))
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('ix_artist_name_trgm', 'name', postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_artist_city_trgm', 'city', postgresql_using='gin',
+                 postgresql_ops={'city': 'gin_trgm_ops'}),
+        db.Index('ix_artist_genres', 'genres', postgresql_using='gin'),
+        db.Index('ix_artist_updated_at', 'updated_at'),
+    )
 
 
 class Show(db.Model):
     _tablename_ = 'Show'
 
     id = db.Column(db.Integer, primary_key=True)
-    artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'), nullable=False)
-    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'), nullable=False)
+    artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'), nullable=False)
+    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'), nullable=False)
     start_time = db.Column(db.DateTime, nullable=False, default=datetime.today())
+    # which of the venue/artist counters this show is currently counted in
+    is_past = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    duration_minutes = db.Column(db.Integer, nullable=False, default=DEFAULT_SHOW_MINUTES,
+                                 server_default=str(DEFAULT_SHOW_MINUTES))
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    # On PostgreSQL the exclusion constraints show_venue_no_overlap and
+    # show_artist_no_overlap (see the migration) reject overlapping bookings.
+    __table_args__ = (
+        db.CheckConstraint(f'duration_minutes BETWEEN 1 AND {MAX_SHOW_MINUTES}',
+                           name='ck_show_duration_minutes'),
+        db.Index('ix_show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_show_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_show_upcoming_start_time', 'start_time',
+                 postgresql_where=db.text('NOT is_past')),
+        db.Index('ix_show_start_time_id', 'start_time', 'id'),
+        db.Index('ix_show_updated_at', 'updated_at'),
+    )
 
 
     # TODO: implement any missing fields, as a database migration using Flask-Migrate
@@ -0,0 +1,197 @@
+from flask import abort, request
+from sqlalchemy import case, func, select, tuple_
+from sqlalchemy.dialects.postgresql import array
+
+from forms import GENRE_CHOICES
+from models import Artist, Show, Venue, db
+
+# Statements behind the read-only pages. Both the regular views and the
+# async views in aio.py execute these, so the two paths issue the same SQL.
+
+GENRES = frozenset(genre for genre, _ in GENRE_CHOICES)
+
+
+def requested_genre():
+    # ?genre= on the listing pages; only the genres the forms offer exist
+    genre = request.args.get('genre') or None
+    if genre is not None and genre not in GENRES:
+        abort(400)
+    return genre
+
+
+def with_genre(stmt, model, genre):
+    # genres @> ARRAY[genre] is served by the GIN index on genres; SQLite
+    # stores genres as a JSON list (see GENRES_TYPE) and looks through it
+    # with json_each
+    if genre is None:
+        return stmt
+    if db.engine.dialect.name == 'postgresql':
+        return stmt.where(model.genres.op('@>')(array([genre])))
+    genres = func.json_each(model.genres).table_valued('value')
+    return stmt.where(select(genres.c.value).where(genres.c.value == genre).exists())
+
+
+def venue_areas(genre=None):
+    # every venue with its maintained upcoming show counter, ordered so that
+    # venues of the same area are adjacent
+    return with_genre(select(
+        Venue.id,
+        Venue.name,
+        Venue.city,
+        Venue.state,
+        Venue.upcoming_shows_count
+    ), Venue, genre).order_by(Venue.state, Venue.city, Venue.name)
+
+
+def group_areas(rows):
+    data = []
+    area = None
+    for venue_id, name, city, state, num_upcoming_shows in rows:
+        if area is None or area['city'] != city or area['state'] != state:
+            area = {
+                "city": city,
+                "state": state,
+                "venues": []
+            }
+            data.append(area)
+        area['venues'].append(
+            {'id': venue_id, 'name': name, 'num_upcoming_shows': num_upcoming_shows})
+    return data
+
+
+def artist_list(genre=None):
+    return with_genre(select(Artist.id, Artist.name), Artist, genre).order_by(
+        Artist.name, Artist.id)
+
+
+def show_list():
+    # only the columns pages/shows.html renders, no entities
+    return select(
+        Show.venue_id,
+        Venue.name.label('venue_name'),
+        Show.artist_id,
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link'),
+        Show.start_time
+    ).join(Venue, Venue.id == Show.venue_id).join(
+        Artist, Artist.id == Show.artist_id).order_by(Show.start_time)
+
+
+def show_range(start, end, limit, after=None, venue_id=None, artist_id=None,
+               city=None, state=None, genre=None):
+    # one page of shows starting in [start, end), keyset-paginated on
+    # (start_time, id): `after` is the last (start_time, id) of the previous
+    # page. Served by ix_show_start_time_id, or by the (venue_id, start_time)
+    # / (artist_id, start_time) indexes when filtering on one of them.
+    stmt = select(
+        Show.id,
+        Show.venue_id,
+        Venue.name.label('venue_name'),
+        Venue.city,
+        Venue.state,
+        Show.artist_id,
+        Artist.name.label('artist_name'),
+        Show.start_time,
+        Show.duration_minutes
+    ).join(Venue, Venue.id == Show.venue_id).join(
+        Artist, Artist.id == Show.artist_id).where(
+        Show.start_time >= start, Show.start_time < end)
+    if after is not None:
+        stmt = stmt.where(tuple_(Show.start_time, Show.id) > tuple_(*after))
+    if venue_id is not None:
+        stmt = stmt.where(Show.venue_id == venue_id)
+    if artist_id is not None:
+        stmt = stmt.where(Show.artist_id == artist_id)
+    if city is not None:
+        stmt = stmt.where(Venue.city == city)
+    if state is not None:
+        stmt = stmt.where(Venue.state == state)
+    # genre is what the artist plays
+    stmt = with_genre(stmt, Artist, genre)
+    return stmt.order_by(Show.start_time, Show.id).limit(limit)
+
+
+def feed_shows(fk, entity_id, since):
+    # every show of a venue or artist from `since` on, for the .ics feeds
+    return select(
+        Show.id,
+        Show.start_time,
+        Show.duration_minutes,
+        Show.updated_at,
+        Venue.name.label('venue_name'),
+        Venue.address,
+        Venue.city,
+        Venue.state,
+        Venue.latitude,
+        Venue.longitude,
+        Artist.name.label('artist_name')
+    ).join(Venue, Venue.id == Show.venue_id).join(
+        Artist, Artist.id == Show.artist_id).where(
+        fk == entity_id, Show.start_time >= since).order_by(Show.start_time, Show.id)
+
+
+def entity(model, entity_id):
+    return select(*model.__table__.columns).where(model.id == entity_id)
+
+
+def entity_shows(fk, entity_id, now, upcoming):
+    # show tiles for a venue or artist page; served by the
+    # (venue_id, start_time) / (artist_id, start_time) indexes
+    when = Show.start_time > now if upcoming else Show.start_time < now
+    return select(
+        Show.venue_id,
+        Venue.name.label('venue_name'),
+        Venue.image_link.label('venue_image_link'),
+        Show.artist_id,
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link'),
+        Show.start_time
+    ).join(Venue, Venue.id == Show.venue_id).join(
+        Artist, Artist.id == Show.artist_id).where(
+        fk == entity_id, when).order_by(Show.start_time)
+
+
+def venue_page(venue_id, now):
+    return (entity(Venue, venue_id),
+            entity_shows(Show.venue_id, venue_id, now, upcoming=True),
+            entity_shows(Show.venue_id, venue_id, now, upcoming=False))
+
+
+def artist_page(artist_id, now):
+    return (entity(Artist, artist_id),
+            entity_shows(Show.artist_id, artist_id, now, upcoming=True),
+            entity_shows(Show.artist_id, artist_id, now, upcoming=False))
+
+
+def table_version(*models):
+    # max(updated_at) and row count per table; max() is served by the
+    # updated_at indexes
+    columns = []
+    for model in models:
+        columns.append(select(func.max(model.updated_at)).scalar_subquery())
+        columns.append(select(func.count(model.id)).scalar_subquery())
+    return select(*columns)
+
+
+def entity_version(model, fk, other, other_fk, entity_id, now):
+    # Everything a venue or artist page depends on: the row itself, its
+    # shows, the other side's names and pictures on the show tiles, and
+    # how many of the shows have started (which moves them to past shows).
+    started = case((Show.start_time <= now, Show.start_time))
+    return select(
+        model.updated_at,
+        func.max(Show.updated_at),
+        func.max(other.updated_at),
+        func.count(Show.id),
+        func.count(started),
+        func.max(started)
+    ).select_from(model).outerjoin(Show, fk == model.id).outerjoin(
+        other, other.id == other_fk).where(model.id == entity_id).group_by(model.id)
+
+
+def venue_version(venue_id, now):
+    return entity_version(Venue, Show.venue_id, Artist, Show.artist_id, venue_id, now)
+
+
+def artist_version(artist_id, now):
+    return entity_version(Artist, Show.artist_id, Venue, Show.venue_id, artist_id, now)
@@ -0,0 +1,149 @@
+import fcntl
+import os
+import pickle
+import tempfile
+import threading
+from collections import deque, namedtuple
+
+from flask import current_app
+from sqlalchemy import select
+from werkzeug.local import LocalProxy
+
+from models import Artist, Venue, db
+
+# Recently listed venues and artists for the home page.
+#
+# The latest RECENT_LISTINGS_SIZE venues and artists are kept in bounded
+# deques, so the home page never runs ORDER BY id DESC. The first read loads
+# them from the database (not create_app, which `import wsgi` runs), and the
+# create handlers push to them from then on. With RECENT_LISTINGS_BACKEND =
+# 'disk' the buffers live in one pickle file shared by every worker on the
+# host: writers take an flock and replace the file, readers re-read it only
+# when it has been replaced. 'memory' keeps them per worker.
+
+KINDS = {'venue': Venue, 'artist': Artist}
+
+Listing = namedtuple('Listing', ['id', 'name', 'city', 'state'])
+
+
+def listing(entity):
+    return Listing(entity.id, entity.name, entity.city, entity.state)
+
+
+class MemoryStore:
+    def __init__(self):
+        self._buffers = None
+        self._lock = threading.Lock()
+
+    def read(self):
+        return self._buffers
+
+    def update(self, change):
+        with self._lock:
+            self._buffers = change(self._buffers)
+
+
+class FileStore:
+    # Written to a temporary name and renamed so readers never see a partial
+    # file; the lock file serializes read-modify-write across workers.
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, 'recent_listings')
+        self._lock_path = self.path + '.lock'
+        self._cached = (None, None)
+
+    def read(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        # every write is a new inode, so this also catches two writes within
+        # the filesystem's mtime resolution
+        version = (stat.st_ino, stat.st_mtime_ns)
+        cached_version, buffers = self._cached
+        if version != cached_version:
+            try:
+                with open(self.path, 'rb') as f:
+                    buffers = pickle.load(f)
+            except (OSError, EOFError, pickle.UnpicklingError):
+                return None
+            self._cached = (version, buffers)
+        return buffers
+
+    def update(self, change):
+        with open(self._lock_path, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            buffers = change(self.read())
+            fd, tmp = tempfile.mkstemp(dir=self.directory)
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(buffers, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self.path)
+
+
+# the app's RecentListings, for blueprints that cannot hold a reference to it
+current_recent_listings = LocalProxy(lambda: current_app.extensions['recent_listings'])
+
+
+class RecentListings:
+    def __init__(self, app=None):
+        self.store = None
+        self.size = 10
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.size = app.config.get('RECENT_LISTINGS_SIZE', 10)
+        backend = app.config.get('RECENT_LISTINGS_BACKEND', 'memory')
+        if backend == 'memory':
+            self.store = MemoryStore()
+        elif backend == 'disk':
+            self.store = FileStore(app.config['RECENT_LISTINGS_DIR'])
+        else:
+            raise ValueError(f'Unknown RECENT_LISTINGS_BACKEND {backend!r}')
+        app.extensions['recent_listings'] = self
+        app.jinja_env.globals['recent_listings'] = self.latest
+
+    def warm(self):
+        buffers = {}
+        for kind, model in KINDS.items():
+            rows = db.session.execute(select(
+                model.id, model.name, model.city, model.state
+            ).order_by(model.id.desc()).limit(self.size))
+            buffers[kind] = deque((Listing(*row) for row in rows), maxlen=self.size)
+        self.store.update(lambda _: buffers)
+        return buffers
+
+    def latest(self):
+        # {'venue': [Listing, ...], 'artist': [...]}, newest first
+        buffers = self.store.read()
+        if buffers is None:
+            buffers = self.warm()
+        return {kind: list(buffer) for kind, buffer in buffers.items()}
+
+    def _change(self, kind, change):
+        def apply(buffers):
+            if buffers is None:
+                # never warmed; the next read loads from the database
+                return None
+            buffer = deque(buffers[kind], maxlen=self.size)
+            change(buffer)
+            return dict(buffers, **{kind: buffer})
+        self.store.update(apply)
+
+    def add(self, kind, entity):
+        self._change(kind, lambda buffer: buffer.appendleft(listing(entity)))
+
+    def update(self, kind, entity):
+        # a renamed or moved entity keeps its place in the buffer
+        def replace(buffer):
+            for i, entry in enumerate(buffer):
+                if entry.id == entity.id:
+                    buffer[i] = listing(entity)
+        self._change(kind, replace)
+
+    def invalidate(self):
+        # after deletes and bulk writes; the next read reloads from the
+        # database
+        self.store.update(lambda _: None)
@@ -0,0 +1,97 @@
+import time
+
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import event, orm
+
+# Read/write session routing.
+#
+# Endpoints listed in REPLICA_ENDPOINTS read from the 'replica' bind when
+# SQLALCHEMY_REPLICA_URI is configured; everything else, and any flush or
+# DML statement, goes to the primary. After a request commits, the client is
+# pinned to the primary for REPLICA_STICKY_SECONDS through a cookie so it
+# reads its own writes despite replication lag. Views that fill the page
+# cache call use_primary() first, so a lagging replica cannot put a stale
+# page into the cache that every later reader would be served.
+
+REPLICA_BIND = 'replica'
+STICKY_COOKIE = 'fyyur_primary_until'
+
+
+class RoutingSession(SignallingSession):
+    def __init__(self, db, **options):
+        self.db = db
+        super().__init__(db, **options)
+
+    def get_bind(self, mapper=None, clause=None):
+        if (not self._flushing and not getattr(clause, 'is_dml', False)
+                and has_request_context() and g.get('_use_replica')):
+            return self.db.get_engine(self.app, bind=REPLICA_BIND)
+        return super().get_bind(mapper, clause)
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _remember_write(session):
+    if has_request_context():
+        g._wrote_to_primary = True
+
+
+def use_primary():
+    g._use_replica = False
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def apply_driver_hacks(self, app, sa_url, options):
+        # SQLALCHEMY_DIALECT_ENGINE_OPTIONS[backend] only reaches engines of
+        # that backend; SQLALCHEMY_ENGINE_OPTIONS is applied to all of them
+        sa_url, options = super().apply_driver_hacks(app, sa_url, options)
+        dialect_options = app.config.get('SQLALCHEMY_DIALECT_ENGINE_OPTIONS') or {}
+        options.update(dialect_options.get(sa_url.get_backend_name(), {}))
+        return sa_url, options
+
+    def create_engine(self, sa_url, engine_opts):
+        engine = super().create_engine(sa_url, engine_opts)
+        if engine.dialect.name == 'sqlite':
+            event.listen(engine, 'connect', _enable_foreign_keys)
+        return engine
+
+    def init_app(self, app):
+        replica = app.config.get('SQLALCHEMY_REPLICA_URI')
+        if replica:
+            binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+            binds[REPLICA_BIND] = replica
+            app.config['SQLALCHEMY_BINDS'] = binds
+        super().init_app(app)
+        app.before_request(_route_request)
+        app.after_request(_pin_after_write)
+
+
+def _enable_foreign_keys(dbapi_connection, connection_record):
+    # shows go with their venue or artist through ON DELETE CASCADE, which
+    # SQLite only enforces when asked to on each connection
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA foreign_keys=ON')
+    cursor.close()
+
+
+def _route_request():
+    config = current_app.config
+    if not config.get('SQLALCHEMY_REPLICA_URI'):
+        return
+    if request.endpoint not in config.get('REPLICA_ENDPOINTS', ()):
+        return
+    pinned_until = request.cookies.get(STICKY_COOKIE, type=float)
+    if pinned_until and pinned_until > time.time():
+        return
+    g._use_replica = True
+
+
+def _pin_after_write(response):
+    if g.get('_wrote_to_primary') and current_app.config.get('SQLALCHEMY_REPLICA_URI'):
+        seconds = current_app.config.get('REPLICA_STICKY_SECONDS', 10)
+        response.set_cookie(STICKY_COOKIE, str(time.time() + seconds),
+                            max_age=seconds, httponly=True, samesite='Lax')
+    return response
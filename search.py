@@ -0,0 +1,139 @@
+from collections import defaultdict, namedtuple
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import array
+
+from forms import GENRE_CHOICES
+from models import db
+
+# Ranked search over name, city and genres for venues and artists.
+#
+# On PostgreSQL the matching is served by the pg_trgm / GIN indexes declared
+# on the models and ranked with similarity(). Any other database (SQLite when
+# running locally) falls back to an in-process trigram inverted index that is
+# built lazily and dropped whenever a venue or artist is written.
+
+SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+
+SearchHit = namedtuple('SearchHit', ['id', 'name'])
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _similarity(a, b):
+    # Same measure as pg_trgm: shared trigrams over all trigrams of both
+    # words, each padded the way pg_trgm pads them.
+    a = _trigrams('  ' + a + ' ')
+    b = _trigrams('  ' + b + ' ')
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _matching_genres(term):
+    term = term.lower()
+    return [genre for genre, _ in GENRE_CHOICES if term in genre.lower()]
+
+
+class InvertedIndex:
+    def __init__(self):
+        self._postings = defaultdict(set)
+        self._docs = {}
+
+    def add(self, doc_id, name, *fields):
+        self.remove(doc_id)
+        name = name or ''
+        text = ' '.join([name] + [f for f in fields if f]).lower()
+        self._docs[doc_id] = (name, text)
+        for gram in _trigrams(text):
+            self._postings[gram].add(doc_id)
+
+    def remove(self, doc_id):
+        doc = self._docs.pop(doc_id, None)
+        if doc is None:
+            return
+        for gram in _trigrams(doc[1]):
+            postings = self._postings[gram]
+            postings.discard(doc_id)
+            if not postings:
+                del self._postings[gram]
+
+    def search(self, term, limit=SEARCH_LIMIT, offset=0):
+        term = term.lower()
+        grams = _trigrams(term)
+        if grams:
+            # intersect from the rarest trigram so the candidate set stays small
+            lists = sorted((self._postings.get(g, set()) for g in grams), key=len)
+            candidates = set(lists[0]).intersection(*lists[1:])
+        else:
+            candidates = self._docs.keys()
+        hits = [
+            (doc_id, self._docs[doc_id][0]) for doc_id in candidates
+            if term in self._docs[doc_id][1]
+        ]
+        hits.sort(key=lambda hit: (-_similarity(hit[1].lower(), term), hit[1], hit[0]))
+        return len(hits), [SearchHit(*hit) for hit in hits[offset:offset + limit]]
+
+
+_indexes = {}
+
+
+def _build_index(model):
+    index = InvertedIndex()
+    rows = db.session.query(model.id, model.name, model.city, model.genres)
+    for doc_id, name, city, genres in rows:
+        index.add(doc_id, name, city, ' '.join(genres or ()))
+    return index
+
+
+def invalidate(model):
+    _indexes.pop(model, None)
+
+
+def postgres_statements(model, term, limit, offset):
+    # (page of ranked hits with a window total, standalone count); the count
+    # is only needed when the page comes back empty
+    pattern = f'%{term}%'
+    criteria = [model.name.ilike(pattern), model.city.ilike(pattern)]
+    genres = _matching_genres(term)
+    if genres:
+        criteria.append(model.genres.op('&&')(array(genres)))
+
+    rank = db.func.similarity(model.name, term)
+    rows = select(
+        model.id,
+        model.name,
+        db.func.count().over().label('total')
+    ).where(db.or_(*criteria)).order_by(
+        rank.desc(), model.name, model.id).limit(limit).offset(offset)
+    count = select(db.func.count(model.id)).where(db.or_(*criteria))
+    return rows, count
+
+
+def hits(rows):
+    return [SearchHit(row.id, row.name) for row in rows]
+
+
+def _search_postgres(model, term, limit, offset):
+    rows_stmt, count_stmt = postgres_statements(model, term, limit, offset)
+    rows = db.session.execute(rows_stmt).all()
+    total = rows[0].total if rows else db.session.execute(count_stmt).scalar()
+    return total, hits(rows)
+
+
+def clamp(limit, offset):
+    return max(1, min(limit, MAX_SEARCH_LIMIT)), max(0, offset)
+
+
+def search(model, term, limit=SEARCH_LIMIT, offset=0):
+    term = term.strip()
+    limit, offset = clamp(limit, offset)
+    if db.engine.dialect.name == 'postgresql':
+        return _search_postgres(model, term, limit, offset)
+    index = _indexes.get(model)
+    if index is None:
+        index = _indexes[model] = _build_index(model)
+    return index.search(term, limit, offset)
@@ -0,0 +1,156 @@
+import random
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask.cli import with_appcontext
+
+from booking import ScheduleChecker
+from counters import reconcile
+from forms import GENRE_CHOICES
+import geo
+from models import Artist, Show, Venue, db
+
+# Synthetic catalog generator. Cities are drawn from a Zipf-like
+# distribution so a handful of areas hold most venues, as in real data;
+# shows are spread over the year before and after now.
+
+CITIES = [
+    ('New York', 'NY'), ('Los Angeles', 'CA'), ('Chicago', 'IL'),
+    ('Houston', 'TX'), ('Phoenix', 'AZ'), ('Philadelphia', 'PA'),
+    ('San Antonio', 'TX'), ('San Diego', 'CA'), ('Dallas', 'TX'),
+    ('San Jose', 'CA'), ('Austin', 'TX'), ('Jacksonville', 'FL'),
+    ('San Francisco', 'CA'), ('Columbus', 'OH'), ('Fort Worth', 'TX'),
+    ('Indianapolis', 'IN'), ('Charlotte', 'NC'), ('Seattle', 'WA'),
+    ('Denver', 'CO'), ('Washington', 'DC'), ('Boston', 'MA'),
+    ('Nashville', 'TN'), ('Detroit', 'MI'), ('Portland', 'OR'),
+    ('Las Vegas', 'NV'), ('Memphis', 'TN'), ('Louisville', 'KY'),
+    ('Baltimore', 'MD'), ('Milwaukee', 'WI'), ('Albuquerque', 'NM'),
+    ('Atlanta', 'GA'), ('Kansas City', 'MO'), ('Miami', 'FL'),
+    ('Minneapolis', 'MN'), ('New Orleans', 'LA'), ('Salt Lake City', 'UT'),
+]
+CITY_WEIGHTS = [1 / rank for rank in range(1, len(CITIES) + 1)]
+
+ADJECTIVES = ['Blue', 'Velvet', 'Electric', 'Golden', 'Wild', 'Silent', 'Neon',
+              'Midnight', 'Crimson', 'Lucky', 'Rusty', 'Hollow', 'Royal', 'Little']
+NOUNS = ['Room', 'Hall', 'Lounge', 'Tavern', 'Garden', 'Theatre', 'Cellar',
+         'Barn', 'Club', 'Parlor', 'Den', 'Dome', 'Loft', 'Harbor']
+BANDS = ['Sax', 'Petals', 'Wolves', 'Echoes', 'Kings', 'Owls', 'Rivers',
+         'Strangers', 'Tigers', 'Ghosts', 'Saints', 'Lanterns', 'Comets']
+GENRES = [genre for genre, _ in GENRE_CHOICES]
+DURATIONS = [60, 90, 120, 180]
+# venues are scattered around their city's centroid, ~5 miles either way
+SPREAD_DEGREES = 0.08
+
+
+def _phone(rng):
+    return ''.join(str(rng.randint(0, 9)) for _ in range(10))
+
+
+def _genres(rng):
+    return rng.sample(GENRES, rng.randint(1, 3))
+
+
+def generate_venues(rng, count):
+    for i in range(count):
+        city, state = rng.choices(CITIES, CITY_WEIGHTS)[0]
+        name = f'The {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {i}'
+        latitude, longitude = geo.locate(city, state)
+        yield {
+            'name': name,
+            'city': city,
+            'state': state,
+            'address': f'{rng.randint(1, 9999)} {rng.choice(ADJECTIVES)} St',
+            'phone': _phone(rng),
+            'image_link': f'https://picsum.photos/seed/venue{i}/400/300',
+            'facebook_link': f'https://www.facebook.com/venue{i}',
+            'genres': _genres(rng),
+            'website_link': f'https://venue{i}.example.com',
+            'seeking_talent': rng.random() < 0.3,
+            'seeking_description': None,
+            'latitude': latitude + rng.gauss(0, SPREAD_DEGREES),
+            'longitude': longitude + rng.gauss(0, SPREAD_DEGREES),
+        }
+
+
+def generate_artists(rng, count):
+    for i in range(count):
+        city, state = rng.choices(CITIES, CITY_WEIGHTS)[0]
+        yield {
+            'name': f'The {rng.choice(ADJECTIVES)} {rng.choice(BANDS)} {i}',
+            'city': city,
+            'state': state,
+            'phone': _phone(rng),
+            'genres': _genres(rng),
+            'image_link': f'https://picsum.photos/seed/artist{i}/400/300',
+            'facebook_link': f'https://www.facebook.com/artist{i}',
+            'website_link': None,
+            'seeking_venue': rng.random() < 0.3,
+            'seeking_description': None,
+        }
+
+
+def generate_shows(rng, count, venue_ids, artist_ids, past_ratio=0.6):
+    # candidates that would double-book a venue or an artist are dropped,
+    # so slightly fewer than count shows may come out
+    now = datetime.now().replace(minute=0, second=0, microsecond=0)
+    schedule = ScheduleChecker()
+    for _ in range(count):
+        hours = rng.randint(1, 365 * 24)
+        offset = -hours if rng.random() < past_ratio else hours
+        show = {
+            'venue_id': rng.choice(venue_ids),
+            'artist_id': rng.choice(artist_ids),
+            'start_time': now + timedelta(hours=offset),
+            'duration_minutes': rng.choice(DURATIONS),
+            'is_past': offset < 0,
+        }
+        if not schedule.check(show['venue_id'], show['artist_id'],
+                              show['start_time'], show['duration_minutes']):
+            yield show
+
+
+def bulk_insert(model, rows, batch_size):
+    table = model.__table__
+    batch = []
+    inserted = 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            db.session.execute(table.insert(), batch)
+            db.session.commit()
+            inserted += len(batch)
+            batch = []
+    if batch:
+        db.session.execute(table.insert(), batch)
+        db.session.commit()
+        inserted += len(batch)
+    return inserted
+
+
+@click.command('seed')
+@click.option('--venues', default=1000, show_default=True)
+@click.option('--artists', default=2000, show_default=True)
+@click.option('--shows', default=10000, show_default=True)
+@click.option('--past-ratio', default=0.6, show_default=True,
+              help='Share of shows generated in the past.')
+@click.option('--batch-size', default=5000, show_default=True)
+@click.option('--seed', 'random_seed', default=42, show_default=True)
+@with_appcontext
+def seed_command(venues, artists, shows, past_ratio, batch_size, random_seed):
+    """Fill the database with a synthetic catalog."""
+    rng = random.Random(random_seed)
+    for model, rows in ((Venue, generate_venues(rng, venues)),
+                        (Artist, generate_artists(rng, artists))):
+        started = time.perf_counter()
+        inserted = bulk_insert(model, rows, batch_size)
+        click.echo(f'{model.__tablename__}: {inserted} rows in {time.perf_counter() - started:.1f}s')
+
+    venue_ids = [i for (i,) in db.session.query(Venue.id)]
+    artist_ids = [i for (i,) in db.session.query(Artist.id)]
+    if shows and venue_ids and artist_ids:
+        started = time.perf_counter()
+        inserted = bulk_insert(
+            Show, generate_shows(rng, shows, venue_ids, artist_ids, past_ratio), batch_size)
+        click.echo(f'show: {inserted} rows in {time.perf_counter() - started:.1f}s')
+        click.echo(f'counters: {reconcile()} rows updated')
@@ -0,0 +1,215 @@
+import sys
+from datetime import datetime
+
+from flask import Blueprint, abort, flash, jsonify, render_template, request
+from sqlalchemy import select, tuple_
+from sqlalchemy.exc import IntegrityError
+
+from booking import ScheduleChecker, booking_conflicts, is_booking_conflict
+from cache import current_page_cache
+from conditional import conditional, show_listing
+import counters
+from forms import ShowForm
+from importer import known_references, prepare_show, validate_row
+from models import Show, db
+import queries
+
+bp = Blueprint('shows', __name__, url_prefix='/shows')
+
+
+#  Shows
+#  ----------------------------------------------------------------
+
+@bp.route('')
+@conditional(show_listing)
+def index():
+    # displays list of shows at /shows
+    data = db.session.execute(queries.show_list()).all()
+    return render_template('pages/shows.html', shows=data)
+
+
+@bp.route('/create')
+def create_shows():
+    # renders form. do not touch.
+    form = ShowForm()
+    return render_template('forms/new_show.html', form=form)
+
+
+@bp.route('/create', methods=['POST'])
+def create_show_submission():
+    # called to create new shows in the db, upon submitting new show listing
+    # form
+    form = ShowForm(request.form)
+    if form.validate():
+        values = form.data
+        invalid = prepare_show(values, datetime.now())
+    else:
+        invalid = form.errors
+    if invalid:
+        # e.g. a missing start time or a duration out of range
+        flash('Show could not be listed. ' + ' '.join(
+            f'{field}: {message.rstrip(".")}.' for field, messages in invalid.items() for message in messages))
+        return render_template('pages/home.html')
+
+    error = False
+    conflicts = {}
+    artist_id, venue_id = values['artist_id'], values['venue_id']
+    try:
+        conflicts = booking_conflicts(venue_id, artist_id, values['start_time'],
+                                      values['duration_minutes'])
+        if not conflicts:
+            show = Show(
+                artist_id=artist_id,
+                venue_id=venue_id,
+                start_time=values['start_time'],
+                duration_minutes=values['duration_minutes'],
+                is_past=values['is_past'])
+            db.session.add(show)
+            counters.apply_show_deltas([(venue_id, artist_id, show.is_past)])
+            db.session.commit()
+            current_page_cache.invalidate(f'venue:{venue_id}', f'artist:{artist_id}')
+    except BaseException as e:
+        error = True
+        if is_booking_conflict(e):
+            # lost a race with a concurrent booking of the same slot
+            conflicts = {'start_time': ['Venue or artist is already booked at that time']}
+        db.session.rollback()
+        print(sys.exc_info())
+    finally:
+        db.session.close()
+    if conflicts:
+        flash('Show could not be listed. ' +
+              ' '.join(f'{message}.' for messages in conflicts.values() for message in messages))
+    elif error:
+        flash('An error occurred. Show could not be listed.')
+    else:
+        flash('Show was successfully listed!')
+    return render_template('pages/home.html')
+
+    # on successful db insert, flash success
+
+    # e.g., flash('An error occurred. Show could not be listed.')
+    # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
+
+
+#  Batch booking
+#  ----------------------------------------------------------------
+#
+#  POST /shows/batch takes a JSON list of shows, or {"shows": [...],
+#  "atomic": true}, each with artist_id, venue_id, start_time and an optional
+#  duration_minutes. Every entry goes through ShowForm; artist and venue ids
+#  are checked with one IN query per table and bookings with one
+#  ScheduleChecker load, and the accepted shows are written with one
+#  multi-row INSERT. With atomic, nothing is written unless every entry is
+#  accepted.
+
+MAX_BATCH_SHOWS = 500
+
+
+def _insert_shows(rows):
+    # Ids are matched back on (venue_id, start_time), which the booking
+    # checks make unique among the batch and the stored shows.
+    table = Show.__table__
+    statement = table.insert().values(rows)
+    keys = [(row['venue_id'], row['start_time']) for row in rows]
+    if db.engine.dialect.full_returning:
+        inserted = db.session.execute(
+            statement.returning(table.c.id, table.c.venue_id, table.c.start_time))
+    else:
+        db.session.execute(statement)
+        inserted = db.session.execute(
+            select(table.c.id, table.c.venue_id, table.c.start_time).where(
+                tuple_(table.c.venue_id, table.c.start_time).in_(keys)))
+    ids = {(venue_id, start_time): show_id for show_id, venue_id, start_time in inserted}
+    return [ids[key] for key in keys]
+
+
+def book_shows(entries, atomic=False):
+    # Returns one result per entry, in order, and the inserted rows; the
+    # caller commits.
+    now = datetime.now()
+    results = [None] * len(entries)
+
+    def reject(index, errors):
+        results[index] = {'index': index, 'status': 'rejected', 'errors': errors}
+
+    candidates = []
+    for index, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            reject(index, {'show': ['Expected an object']})
+            continue
+        values, errors = validate_row(ShowForm, entry)
+        errors = errors or prepare_show(values, now)
+        if errors:
+            reject(index, errors)
+        else:
+            candidates.append((index, values))
+
+    known_artists, known_venues = known_references([values for _, values in candidates])
+    referenced = []
+    for index, values in candidates:
+        errors = {}
+        if values['artist_id'] not in known_artists:
+            errors['artist_id'] = ['Unknown artist']
+        if values['venue_id'] not in known_venues:
+            errors['venue_id'] = ['Unknown venue']
+        if errors:
+            reject(index, errors)
+        else:
+            referenced.append((index, values))
+
+    # against the stored schedule and against earlier entries of the batch
+    checker = ScheduleChecker.load(values for _, values in referenced)
+    valid = []
+    for index, values in referenced:
+        errors = checker.check(values['venue_id'], values['artist_id'],
+                               values['start_time'], values['duration_minutes'])
+        if errors:
+            reject(index, errors)
+        else:
+            valid.append((index, values))
+
+    if not valid or (atomic and len(valid) < len(entries)):
+        for index, _ in valid:
+            results[index] = {'index': index, 'status': 'not_created'}
+        return results, []
+
+    rows = [values for _, values in valid]
+    for (index, _), show_id in zip(valid, _insert_shows(rows)):
+        results[index] = {'index': index, 'status': 'created', 'id': show_id}
+    counters.apply_show_deltas((v['venue_id'], v['artist_id'], v['is_past']) for v in rows)
+    return results, rows
+
+
+@bp.route('/batch', methods=['POST'])
+def create_shows_batch():
+    payload = request.get_json(silent=True)
+    entries, atomic = payload, False
+    if isinstance(payload, dict):
+        entries, atomic = payload.get('shows'), bool(payload.get('atomic'))
+    if not isinstance(entries, list) or not entries:
+        abort(400, description='Expected a JSON list of shows')
+    if len(entries) > MAX_BATCH_SHOWS:
+        abort(413, description=f'At most {MAX_BATCH_SHOWS} shows per batch')
+
+    try:
+        results, created = book_shows(entries, atomic)
+        db.session.commit()
+    except IntegrityError as e:
+        db.session.rollback()
+        if not is_booking_conflict(e):
+            raise
+        # lost a race with a concurrent booking; the insert was all or nothing
+        return jsonify({'error': 'Venue or artist was booked concurrently, no shows were listed.'}), 409
+    finally:
+        db.session.close()
+
+    if created:
+        current_page_cache.invalidate(
+            *{f'venue:{row["venue_id"]}' for row in created},
+            *{f'artist:{row["artist_id"]}' for row in created})
+    return jsonify({
+        'created': len(created),
+        'rejected': sum(result['status'] == 'rejected' for result in results),
+        'results': results,
+    }), 201 if created else 422
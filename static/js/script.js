@@ -2,3 +2,28 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+// Name suggestions for the search boxes from /autocomplete.
+$(function () {
+  $('input[data-autocomplete]').each(function () {
+    var input = $(this);
+    var list = $('#' + input.attr('list'));
+    var timer = null;
+    input.on('input', function () {
+      clearTimeout(timer);
+      timer = setTimeout(function () {
+        var q = input.val();
+        if (!q) {
+          list.empty();
+          return;
+        }
+        $.getJSON('/autocomplete', {q: q, type: input.data('autocomplete')}, function (response) {
+          list.empty();
+          $.each(response.data, function (_, suggestion) {
+            list.append($('<option>').attr('value', suggestion.name));
+          });
+        });
+      }, 100);
+    });
+  });
+});
@@ -0,0 +1,130 @@
+import os
+import random
+import shutil
+import tempfile
+import time
+
+import click
+from flask import current_app
+from flask.cli import AppGroup, with_appcontext
+from jinja2 import FileSystemBytecodeCache
+
+from models import Artist, Venue, db
+
+# Compiled template cache shared by all workers.
+#
+# Jinja compiles every template to Python source and then to a code object
+# the first time a worker loads it. With a FileSystemBytecodeCache the code
+# objects are written to TEMPLATE_CACHE_DIR and loaded by every later worker,
+# so `flask templates compile` during the build means no worker compiles
+# anything after a deploy or scale-up. Entries are keyed by template name and
+# checked against the source checksum, so an edited template is recompiled.
+
+
+class TemplateCache:
+    def __init__(self, app=None):
+        self.bytecode_cache = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['template_cache'] = self
+        directory = app.config.get('TEMPLATE_CACHE_DIR')
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self.bytecode_cache = FileSystemBytecodeCache(directory)
+            app.jinja_env.bytecode_cache = self.bytecode_cache
+
+
+def page_templates(env):
+    return env.list_templates(filter_func=lambda name: name.endswith('.html'))
+
+
+def compile_templates(env):
+    # Loads every template once; with a bytecode cache configured that
+    # writes each one to it. Returns {name: compile ms}.
+    timings = {}
+    for name in page_templates(env):
+        env.cache.clear()
+        started = time.perf_counter()
+        env.get_template(name)
+        timings[name] = (time.perf_counter() - started) * 1000
+    return timings
+
+
+def _first_byte_ms(client, method, url, data):
+    started = time.perf_counter()
+    response = client.open(url, method=method, data=data, buffered=False)
+    elapsed = (time.perf_counter() - started) * 1000
+    response.close()
+    return elapsed, response.status_code
+
+
+def startup_report(app, random_seed=0):
+    # Time to first byte of every page as a fresh worker sees it: cold (no
+    # bytecode cache), warm (bytecode cache populated) and hot (templates
+    # already in the worker's memory). Runs against a scratch bytecode
+    # cache so the deployed one is left alone.
+    from bench import routes
+
+    rng = random.Random(random_seed)
+    venue_ids = [i for (i,) in db.session.query(Venue.id).limit(1000)] or [1]
+    artist_ids = [i for (i,) in db.session.query(Artist.id).limit(1000)] or [1]
+    pages = [(label, method, url(), data() if data else None)
+             for label, method, url, data in routes(rng, venue_ids, artist_ids,
+                                                     venue_ids[0], artist_ids[0])
+             if method == 'GET' and not label.startswith('GET /api')]
+
+    env = app.jinja_env
+    deployed = env.bytecode_cache
+    scratch = tempfile.mkdtemp(prefix='fyyur-templates-')
+    env.bytecode_cache = FileSystemBytecodeCache(scratch)
+    page_cache = app.extensions['page_cache']
+    backend, page_cache.backend = page_cache.backend, None
+    client = app.test_client()
+    report = []
+    try:
+        for label, method, url, data in pages:
+            env.cache.clear()
+            env.bytecode_cache.clear()
+            cold, status = _first_byte_ms(client, method, url, data)
+            env.cache.clear()
+            warm, _ = _first_byte_ms(client, method, url, data)
+            hot, _ = _first_byte_ms(client, method, url, data)
+            report.append({'page': label, 'status': status, 'cold_ms': round(cold, 2),
+                           'warm_ms': round(warm, 2), 'hot_ms': round(hot, 2)})
+    finally:
+        env.bytecode_cache = deployed
+        env.cache.clear()
+        page_cache.backend = backend
+        shutil.rmtree(scratch, ignore_errors=True)
+    return report
+
+
+templates_cli = AppGroup('templates', help='Precompile templates and time cold starts.')
+
+
+@templates_cli.command('compile')
+@with_appcontext
+def compile_command():
+    """Compile every template into the bytecode cache."""
+    env = current_app.jinja_env
+    if env.bytecode_cache is None:
+        raise click.ClickException('TEMPLATE_CACHE_DIR is not configured.')
+    timings = compile_templates(env)
+    click.echo(f'{len(timings)} templates compiled in {sum(timings.values()):.1f}ms '
+               f'into {current_app.config["TEMPLATE_CACHE_DIR"]}')
+
+
+@templates_cli.command('report')
+@with_appcontext
+def report_command():
+    """Time to first byte per page with a cold, warm and hot template cache."""
+    current_app.config['WTF_CSRF_ENABLED'] = False
+    report = startup_report(current_app._get_current_object())
+    click.echo(f'{"page":<32}{"cold":>9}{"warm":>9}{"hot":>9}  status')
+    for r in report:
+        click.echo(f'{r["page"]:<32}{r["cold_ms"]:>9}{r["warm_ms"]:>9}{r["hot_ms"]:>9}  {r["status"]}')
+    cold = sum(r['cold_ms'] for r in report)
+    warm = sum(r['warm_ms'] for r in report)
+    click.echo(f'{"total":<32}{cold:>9.2f}{warm:>9.2f}')
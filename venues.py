@@ -0,0 +1,215 @@
+import sys
+from datetime import datetime
+
+from flask import Blueprint, abort, flash, jsonify, redirect, render_template, request, url_for
+
+import autocomplete
+import bulk
+from cache import current_page_cache, next_show_time, page_is_cacheable, page_keys
+from conditional import conditional, page_version, venue_detail, venue_feed, venue_listing
+from forms import GENRE_CHOICES, VenueForm
+import geo
+import ical
+from models import Show, Venue, db
+import queries
+from recent import current_recent_listings
+from routing import use_primary
+import search
+
+bp = Blueprint('venues', __name__, url_prefix='/venues')
+
+
+#  Venues
+#  ----------------------------------------------------------------
+
+@bp.route('')
+@conditional(venue_listing)
+def index():
+    genre = queries.requested_genre()
+    rows = db.session.execute(queries.venue_areas(genre)).all()
+    return render_template('pages/venues.html', areas=queries.group_areas(rows),
+                           genres=GENRE_CHOICES, genre=genre)
+
+
+@bp.route('/search', methods=['POST'])
+def search_venues():
+    search_term = request.form.get('search_term', '')
+    count, venues = search.search(
+        Venue, search_term,
+        limit=request.form.get('limit', search.SEARCH_LIMIT, type=int),
+        offset=request.form.get('offset', 0, type=int))
+    response = {
+        "count": count,
+        "data": venues
+    }
+    return render_template(
+        'pages/search_venues.html',
+        results=response,
+        search_term=request.form.get(
+            'search_term',
+            ''))
+
+
+@bp.route('/nearby')
+def nearby_venues():
+    # ?lat=&lng= or ?city=&state=, plus optional k and miles
+    lat, lng = geo.requested_point()
+    k, miles = geo.requested_limits()
+    venues = geo.nearby(lat, lng, k, miles)
+    return jsonify({'count': len(venues), 'data': [venue._asdict() for venue in venues]})
+
+
+@bp.route('/<int:venue_id>')
+@conditional(venue_detail)
+def show_venue(venue_id):
+    key = f'venue:{venue_id}'
+    cacheable = page_is_cacheable()
+    if cacheable:
+        body = current_page_cache.get(key, page_version())
+        if body is not None:
+            return body
+        use_primary()
+
+    venue_stmt, upcoming_stmt, past_stmt = queries.venue_page(venue_id, datetime.now())
+    data = db.session.execute(venue_stmt).first()
+    if data is None:
+        abort(404)
+    upcoming_shows = db.session.execute(upcoming_stmt).all()
+    past_shows = db.session.execute(past_stmt).all()
+
+    body = render_template('pages/show_venue.html', venue=data,
+                           upcoming_shows=upcoming_shows, past_shows=past_shows)
+    if cacheable:
+        current_page_cache.set(key, body, next_show_time(upcoming_shows), page_version())
+    return body
+
+
+@bp.route('/<int:venue_id>/calendar.ics')
+@conditional(venue_feed)
+def venue_calendar(venue_id):
+    venue = db.session.execute(queries.entity(Venue, venue_id)).first()
+    if venue is None:
+        abort(404)
+    return ical.calendar_response(venue.name, f'venue-{venue_id}.ics', queries.feed_shows(
+        Show.venue_id, venue_id, ical.feed_start()))
+
+
+#  Create Venue
+#  ----------------------------------------------------------------
+
+@bp.route('/create', methods=['GET'])
+def create_venue_form():
+    form = VenueForm(request.form)
+    return render_template('forms/new_venue.html', form=form)
+
+
+@bp.route('/create', methods=['POST'])
+def create_venue_submission():
+    form = VenueForm(request.form)
+    if form.validate():
+        add = request.form.get
+        try:
+            print(request.form.getlist('genres'))
+            new_venue = Venue(name=add('name'), city=add('city'), state=add('state'), address=add('address'),
+                              phone=add('phone'), genres=request.form.getlist('genres'), website_link=add('website_link'),
+                              facebook_link=add('facebook_link'),
+                              seeking_talent=form.seeking_talent.data,
+                              seeking_description=add('seeking_description'),
+                              **geo.coordinates(add('city'), add('state')))
+
+            db.session.add(new_venue)
+            db.session.commit()
+            search.invalidate(Venue)
+            geo.update(new_venue)
+            autocomplete.update('venue', new_venue.id, new_venue.name)
+            current_recent_listings.add('venue', new_venue)
+            flash('Venue ' + request.form['name'] + ' was listed!')
+        except:
+            db.session.rollback()
+            flash('An error occurred. Venue ' + add('name') + ' could not be listed.')
+        return redirect(url_for('index'))
+    else:
+        print(form.form_errors)
+        flash('An error occurred')
+        return redirect(url_for('index'))
+
+
+@bp.route('/<int:venue_id>', methods=['DELETE'])
+def delete_venue(venue_id):
+    # Set-based delete; the venue's shows go with it through ON DELETE CASCADE.
+    # Handle cases where the session commit could fail.
+    error = False
+    try:
+        keys = bulk.delete_entities(Venue, [venue_id])
+        db.session.commit()
+        search.invalidate(Venue)
+        geo.discard(venue_id)
+        autocomplete.discard('venue', venue_id)
+        current_recent_listings.invalidate()
+        current_page_cache.invalidate(*keys)
+    except BaseException:
+        error = True
+        db.session.rollback()
+        print(sys.exc_info())
+    finally:
+        db.session.close()
+    if error:
+        flash('An error occurred. Venue could not be deleted.')
+    else:
+        flash('Venue was successfully deleted.')
+    return render_template('pages/home.html')
+
+
+#  Update
+#  ----------------------------------------------------------------
+
+@bp.route('/<int:venue_id>/edit', methods=['GET'])
+def edit_venue(venue_id):
+    form = VenueForm()
+    # TODO: populate form with values from venue with ID <venue_id>
+    venue = Venue.query.get(venue_id)
+    form.name.data = venue.name
+    form.city.data = venue.city
+    form.state.data = venue.state
+    form.phone.data = venue.phone
+    form.genres.data = venue.genres
+    form.facebook_link.data = venue.facebook_link
+    form.image_link.data = venue.image_link
+    form.website_link.data = venue.website_link
+    form.seeking_talent.data = venue.seeking_talent
+    form.seeking_description.data = venue.seeking_description
+
+    return render_template('forms/edit_venue.html', form=form, venue=venue)
+
+
+@bp.route('/<int:venue_id>/edit', methods=['POST'])
+def edit_venue_submission(venue_id):
+    # TODO: take values from the form submitted, and update existing
+    # venue record with ID <venue_id> using the new attributes
+    venue = Venue.query.get(venue_id)
+    form = VenueForm(request.form)
+    if form.validate():
+        moved = (venue.city, venue.state) != (form.city.data, form.state.data)
+        venue.name = form.name.data
+        venue.city = form.city.data
+        venue.state = form.state.data
+        venue.phone = form.phone.data
+        venue.genres = form.genres.data
+        venue.facebook_link = form.facebook_link.data
+        venue.image_link = form.image_link.data
+        venue.website_link = form.website_link.data
+        venue.seeking_talent = form.seeking_talent.data
+        venue.seeking_description = form.seeking_description.data
+        if moved:
+            # coordinates set by other means are kept unless the city changes
+            venue.latitude, venue.longitude = geo.locate(venue.city, venue.state) or (None, None)
+        db.session.commit()
+        search.invalidate(Venue)
+        geo.update(venue)
+        autocomplete.update('venue', venue.id, venue.name)
+        current_recent_listings.update('venue', venue)
+        current_page_cache.invalidate(*page_keys(Venue, venue_id))
+        return redirect(url_for('venues.show_venue', venue_id=venue_id))
+    else:
+        flash(f'An error occurred. Please check the form properly and try again.')
+    return redirect(url_for('venues.show_venue', venue_id=venue_id))